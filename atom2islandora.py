@@ -1,87 +1,1186 @@
+import argparse
+import codecs
+import contextlib
 import csv
+import io
+import json
+import mimetypes
 import re
 import os
+import queue
+import sqlite3
+import struct
 import subprocess
-import tkinter as tk
-from tkinter import filedialog
+import sys
+import threading
+import time
+import traceback
+import zlib
+from bisect import bisect_left
+from functools import lru_cache
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
 import zipfile
 
 def select_folder_dialog(title="Select folder"):
+    # tkinter is only imported when a dialog is needed, so headless runs never load it
+    import tkinter as tk
+    from tkinter import filedialog
     root = tk.Tk()
     root.withdraw()
     folder_selected = filedialog.askdirectory(title=title)
     root.destroy()
     return folder_selected
 
-def run_exiftool_and_create_source2_csv(dest_folder, source_folder):
-    exiftool_path = r"C:\Windows\exiftool.exe"
+class RunReport:
+    """
+    Per-stage instrumentation for one run: wall time, CPU time (own and child processes
+    such as exiftool), rows processed and peak memory, plus named counters. Written as
+    JSON next to product.csv so slow ingests can be diagnosed.
+    """
+    def __init__(self, mode):
+        self.data = {"mode": mode, "started": datetime.now().astimezone().isoformat(timespec="seconds"), "stages": [], "counters": {}}
+
+    def start(self, name):
+        times = os.times()
+        return {"stage": name, "_wall": time.perf_counter(), "_cpu": times.user + times.system,
+                "_child_cpu": times.children_user + times.children_system}
+
+    def finish(self, entry, rows=None):
+        times = os.times()
+        self.data["stages"].append({
+            "stage": entry["stage"],
+            "wall_seconds": round(time.perf_counter() - entry["_wall"], 4),
+            "cpu_seconds": round(times.user + times.system - entry["_cpu"], 4),
+            "child_cpu_seconds": round(times.children_user + times.children_system - entry["_child_cpu"], 4),
+            "rows": rows,
+            "peak_memory_mb": peak_memory_mb(),
+        })
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # with report.stage("name") as stage: ... stage["rows"] = n
+        entry = self.start(name)
+        result = {"rows": None}
+        try:
+            yield result
+        finally:
+            self.finish(entry, result["rows"])
+
+    def count(self, name, value=1):
+        self.data["counters"][name] = self.data["counters"].get(name, 0) + value
+
+    def write(self, path):
+        self.data["total_wall_seconds"] = round(sum(st["wall_seconds"] for st in self.data["stages"]), 4)
+        with open(path, "w", encoding="utf-8") as rf:
+            json.dump(self.data, rf, indent=2)
+        print(f"Run report written to {path}")
+
+def peak_memory_mb():
+    # Peak resident memory of this process so far, or None where it can't be read
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+    except ImportError:
+        pass
+    if os.name == "nt":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        get_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+        if get_info(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return round(counters.PeakWorkingSetSize / (1024 * 1024), 1)
+    return None
+
+@contextlib.contextmanager
+def profiled(profile_path, enabled=True):
+    # Run the block under cProfile and dump the stats (view with python -m pstats)
+    if not enabled:
+        yield
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+        print(f"Profile written to {profile_path}")
+
+CHECKPOINT_NAME = "checkpoint.json"
+# source1 rows between product checkpoints; each one flushes product.csv and rewrites the JSON
+CHECKPOINT_EVERY_ROWS = 1000
+
+def file_signature(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+class RunCheckpoint:
+    """
+    Progress of an archives run, kept as JSON so a failed or interrupted run can be resumed:
+    the inputs it was started with, the prompt answers, whether the scan finished (with the
+    signature of the source2.csv it wrote) and, under "product", where source1_to_product
+    got to. Every save rewrites the whole file through a temporary file, so a crash leaves
+    either the old or the new checkpoint. Lists that only grow during a run (the rows
+    source1_to_product has written or reported) go to a journal of JSON lines beside it
+    instead, so a save only appends what is new; the checkpoint keeps the journal's length.
+    """
+    def __init__(self, path, inputs):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + "_rows.jsonl"
+        self.data = {"inputs": inputs}
+        # A pipelined scan saves from its own thread
+        self.lock = threading.Lock()
+
+    def load(self):
+        # Picks up an existing checkpoint for the same inputs; returns whether one was found
+        try:
+            with open(self.path, encoding="utf-8") as cf:
+                data = json.load(cf)
+        except FileNotFoundError:
+            return False
+        except ValueError:
+            print(f"Ignoring unreadable checkpoint {self.path}")
+            return False
+        if data.get("inputs") != self.data["inputs"]:
+            print(f"Ignoring {self.path}: it was written for different inputs")
+            return False
+        self.data = data
+        return True
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def save(self, **fields):
+        with self.lock:
+            self.data.update(fields)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as cf:
+                json.dump(self.data, cf)
+            os.replace(tmp_path, self.path)
+
+    def append_journal(self, entries):
+        # Appends entries (JSON values); returns the journal length to save with them
+        with open(self.journal_path, "ab") as jf:
+            jf.writelines(json.dumps(entry).encode("utf-8") + b"\n" for entry in entries)
+            return jf.tell()
+
+    def read_journal(self, length):
+        """
+        Entries in the first length bytes of the journal, which is cut back to that length
+        (dropping anything appended after the last save). None if the journal is shorter.
+        """
+        with open(self.journal_path, "a+b") as jf:
+            jf.seek(0)
+            data = jf.read(length)
+            if len(data) < length:
+                return None
+            jf.truncate(length)
+        return [json.loads(line) for line in data.splitlines()]
+
+    def remove(self):
+        for path in (self.path, self.journal_path):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+EXIFTOOL_PATH = r"C:\Windows\exiftool.exe"
+EXIFTOOL_TAGS = [
+    "-SourceFile", "-Title", "-FileName", "-FileCreateDate", "-PageCount",
+    "-FileTypeExtension", "-MIMEType", "-LayerCount",
+]
+# Files sent to an exiftool worker per -execute in parallel mode
+EXIFTOOL_BATCH_SIZE = 250
+# File list handed to a streaming exiftool run with -@ when the scan is prefiltered
+EXIFTOOL_ARGFILE_NAME = "exiftool_args.txt"
+SOURCE2_CACHE_NAME = "source2_cache.sqlite"
+
+# "exiftool" runs the external tool; "python" reads file headers with probe_file_metadata
+METADATA_BACKENDS = ("exiftool", "python")
+
+class ScanCancel:
+    """
+    Lets another thread stop one metadata scan (run_archives with pipeline=True runs the
+    scan in a background thread): cancel() kills the exiftool processes the scan started
+    and makes the rest of that scan fail at once. Other scans are not affected.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processes = set()
+        self.cancelled = False
+
+    def check(self):
+        if self.cancelled:
+            raise RuntimeError("Metadata scan cancelled")
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            for proc in self.processes:
+                with contextlib.suppress(OSError):
+                    proc.kill()
+
+def start_scan_process(args, cancel=None, **popen_args):
+    # subprocess.Popen for a metadata scan; pass the result to scan_process_done after waiting
+    if cancel is None:
+        return subprocess.Popen(args, **popen_args)
+    with cancel.lock:
+        cancel.check()
+        proc = subprocess.Popen(args, **popen_args)
+        cancel.processes.add(proc)
+    return proc
+
+def scan_process_done(proc, cancel=None):
+    if cancel is not None:
+        with cancel.lock:
+            cancel.processes.discard(proc)
+
+def run_exiftool_and_create_source2_csv(dest_folder, source_folder, workers=1, use_cache=False, backend="exiftool",
+                                        file_filter=None, cancel=None):
+    # file_filter(relpath) -> bool limits the scan to the files it keeps (see LocatorPrefilter);
+    # cancel is an optional ScanCancel
+    if backend not in METADATA_BACKENDS:
+        raise ValueError(f"Unknown metadata backend: {backend}")
     output_csv = os.path.join(dest_folder, "source2.csv")
-    args = [
-        exiftool_path,
-        "-csv", "-r",
-        "-SourceFile", "-Title", "-FileName", "-FileCreateDate", "-PageCount",
-        "-FileTypeExtension", "-MIMEType", "-LayerCount",
-        "*"
-    ]
+    if use_cache:
+        cache_path = os.path.join(dest_folder, SOURCE2_CACHE_NAME)
+        rows = scan_with_cache(cache_path, source_folder, workers, backend, file_filter, cancel)
+        write_source2_csv(output_csv, rows)
+        print(f"source2.csv generated at {output_csv} ({len(rows)} files, cache {cache_path})")
+        return
+    if backend != "exiftool" or (workers and workers > 1) or file_filter:
+        relpaths = list_source_files(source_folder)
+        if file_filter:
+            relpaths = filter_source_files(relpaths, file_filter)
+        # exiftool is given the listed files through its -@ argument file instead of -r *
+        rows = scan_source_files(source_folder, relpaths, workers, backend, cancel)
+        write_source2_csv(output_csv, rows)
+        print(f"source2.csv generated at {output_csv} ({len(rows)} files, {backend} backend, {workers or 1} workers)")
+        return
+    args = [EXIFTOOL_PATH, "-csv", "-r"] + EXIFTOOL_TAGS + ["*"]
     with open(output_csv, "w", encoding="utf-8") as outfile:
-        subprocess.run(args, cwd=source_folder, stdout=outfile, check=True)
+        proc = start_scan_process(args, cancel, cwd=source_folder, stdout=outfile)
+        try:
+            proc.wait()
+        except BaseException:
+            proc.kill()
+            raise
+        finally:
+            scan_process_done(proc, cancel)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, args)
     print(f"source2.csv generated at {output_csv}")
 
-def extract_and_rename_zip(source_dir):
-    for fname in os.listdir(source_dir):
-        if fname.lower().endswith('.zip'):
-            zip_path = os.path.join(source_dir, fname)
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(source_dir)
-                for extracted_name in zip_ref.namelist():
-                    if extracted_name.lower().endswith('.csv'):
-                        src = os.path.join(source_dir, extracted_name)
-                        dst = os.path.join(source_dir, 'source1.csv')
-                        if os.path.basename(src) != 'source1.csv':
-                            os.rename(src, dst)
-                        else:
-                            dst = src
-                        print(f"Extracted and renamed {extracted_name} to source1.csv")
-                        return dst
-            break
+def scan_source_files(source_folder, relpaths, workers=1, backend="exiftool", cancel=None):
+    # Metadata rows for relpaths, in relpaths order, from the chosen backend
+    workers = max(1, workers or 1)
+    if backend == "exiftool":
+        return scan_with_exiftool_workers(source_folder, relpaths, workers, cancel)
+    if backend == "python":
+        def probe(relpath):
+            if cancel is not None:
+                cancel.check()
+            return probe_file_metadata(source_folder, relpath)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return [row for row in pool.map(probe, relpaths) if row]
+    raise ValueError(f"Unknown metadata backend: {backend}")
+
+def filter_source_files(files, file_filter):
+    # The list_source_files entries (relpaths or stat tuples) whose relpath file_filter keeps
+    kept = [f for f in files if file_filter(f if isinstance(f, str) else f[0])]
+    print(f"Prefilter: scanning {len(kept)} of {len(files)} files; no AtoM locator can match the others")
+    return kept
+
+def list_source_files(source_folder, with_stat=False):
+    """
+    Walk source_folder and return every file as a "/"-separated path relative to it,
+    sorted, in the same form exiftool reports as SourceFile for "-r *".
+    Names starting with "." are skipped, as "*" and exiftool's recursion skip them.
+    With with_stat, (relpath, size, mtime_ns) tuples are returned instead.
+    """
+    found = []
+    pending = [("", source_folder)]
+    while pending:
+        reldir, dirpath = pending.pop()
+        with os.scandir(dirpath) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                relpath = f"{reldir}/{entry.name}" if reldir else entry.name
+                if entry.is_dir():
+                    pending.append((relpath, entry.path))
+                elif entry.is_file():
+                    if with_stat:
+                        st = entry.stat()
+                        found.append((relpath, st.st_size, st.st_mtime_ns))
+                    else:
+                        found.append(relpath)
+    found.sort()
+    return found
+
+class ExiftoolWorker:
+    """
+    One exiftool process in -stay_open mode. Each call to scan() sends a batch of files
+    through the argument pipe and parses the CSV that exiftool writes back.
+    """
+    def __init__(self, source_folder, cancel=None):
+        self.args = [EXIFTOOL_PATH, "-stay_open", "True", "-@", "-"]
+        self.cancel = cancel
+        self.proc = start_scan_process(self.args, cancel, cwd=source_folder, stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE)
+
+    def scan(self, relpaths):
+        lines = ["-charset", "filename=utf8", "-csv"] + EXIFTOOL_TAGS
+        # A leading "-" would be read as an option, so such files are passed as ./name
+        lines += [("./" + rp if rp.startswith("-") else rp) for rp in relpaths]
+        lines.append("-execute")
+        self.proc.stdin.write(("\n".join(lines) + "\n").encode("utf-8"))
+        self.proc.stdin.flush()
+        output = []
+        while True:
+            line = self.proc.stdout.readline()
+            if not line:
+                raise subprocess.CalledProcessError(self.proc.poll(), self.args)
+            if line.rstrip(b"\r\n") == b"{ready}":
+                break
+            output.append(line)
+        rows = list(csv.DictReader(io.StringIO(b"".join(output).decode("utf-8"), newline="")))
+        for row in rows:
+            if row.get("SourceFile", "").startswith("./-"):
+                row["SourceFile"] = row["SourceFile"][2:]
+        return rows
+
+    def close(self):
+        try:
+            self.proc.stdin.write(b"-stay_open\nFalse\n")
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.proc.wait()
+        scan_process_done(self.proc, self.cancel)
+
+def scan_with_exiftool_workers(source_folder, relpaths, workers, cancel=None):
+    """
+    Scan relpaths with several -stay_open exiftool processes pulling batches from a
+    shared queue. Rows come back in relpaths order regardless of which worker read them.
+    """
+    batches = queue.Queue()
+    for start in range(0, len(relpaths), EXIFTOOL_BATCH_SIZE):
+        batches.put((start, relpaths[start:start + EXIFTOOL_BATCH_SIZE]))
+    results = {}
+
+    def run_worker():
+        worker = ExiftoolWorker(source_folder, cancel)
+        try:
+            while True:
+                try:
+                    start, batch = batches.get_nowait()
+                except queue.Empty:
+                    return
+                results[start] = worker.scan(batch)
+        finally:
+            worker.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_worker) for _ in range(min(workers, batches.qsize()))]
+        for future in futures:
+            future.result()
+
+    rows = []
+    for start in sorted(results):
+        rows.extend(results[start])
+    return rows
+
+def scan_with_cache(cache_path, source_folder, workers=1, backend="exiftool", file_filter=None, cancel=None):
+    """
+    Return source2 rows for every file under source_folder (or every file file_filter
+    keeps), running the metadata backend only on files that are new or whose size or mtime
+    changed since the last run. Rows are kept in a SQLite cache keyed by relative path; the
+    cache is reset if source_folder or the backend changes. Files left out by file_filter
+    keep their cached rows for later runs.
+    """
+    conn = sqlite3.connect(cache_path)
+    try:
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS files (relpath TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, row TEXT)")
+            cache_owner = f"{backend}:{os.path.abspath(source_folder)}"
+            stored = conn.execute("SELECT value FROM meta WHERE key = 'source_folder'").fetchone()
+            if not stored or stored[0] != cache_owner:
+                conn.execute("DELETE FROM files")
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('source_folder', ?)", (cache_owner,))
+
+        cached = {relpath: (size, mtime_ns, row) for relpath, size, mtime_ns, row in conn.execute("SELECT relpath, size, mtime_ns, row FROM files")}
+        current = list_source_files(source_folder, with_stat=True)
+        current_paths = {relpath for relpath, _, _ in current}
+        if file_filter:
+            current = filter_source_files(current, file_filter)
+        changed = [relpath for relpath, size, mtime_ns in current if cached.get(relpath, (None, None))[:2] != (size, mtime_ns)]
+        changed_paths = set(changed)
+        print(f"{len(current) - len(changed)} files unchanged, scanning {len(changed)} new or changed files ({backend} backend)")
+
+        scanned = {}
+        if changed:
+            for row in scan_source_files(source_folder, changed, workers, backend, cancel):
+                scanned[row.get("SourceFile", "")] = row
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO files (relpath, size, mtime_ns, row) VALUES (?, ?, ?, ?)",
+                [(relpath, size, mtime_ns, json.dumps(scanned[relpath])) for relpath, size, mtime_ns in current if relpath in scanned],
+            )
+            conn.executemany("DELETE FROM files WHERE relpath = ?", [(relpath,) for relpath in cached if relpath not in current_paths])
+
+        # Files the backend could not read are left out, as a full scan would leave them out
+        rows = []
+        for relpath, _, _ in current:
+            if relpath in scanned:
+                rows.append(scanned[relpath])
+            elif relpath not in changed_paths:
+                rows.append(json.loads(cached[relpath][2]))
+        return rows
+    finally:
+        conn.close()
+
+def write_source2_csv(output_csv, rows):
+    # Header is the union of every row's columns: requested tags first, in request order
+    tag_order = [t.lstrip("-") for t in EXIFTOOL_TAGS]
+    header = []
+    for row in rows:
+        for col in row:
+            if col not in header:
+                header.append(col)
+    header.sort(key=lambda col: tag_order.index(col) if col in tag_order else len(tag_order))
+    with open(output_csv, "w", newline="", encoding="utf-8") as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=header, restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+
+def iter_exiftool_json(stream, chunk_size=1 << 16):
+    """
+    Yield the file objects of exiftool's -j output from a binary stream as they arrive.
+    Numbers are kept as the text exiftool printed, so values read as they do in -csv output.
+    """
+    decoder = json.JSONDecoder(parse_int=str, parse_float=str)
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    while True:
+        chunk = stream.read1(chunk_size)
+        buf += utf8.decode(chunk, final=not chunk)
+        pos = 0
+        while True:
+            # Skip the "[", "," and "]" around and between the objects
+            while pos < len(buf) and buf[pos] in "[,] \t\r\n":
+                pos += 1
+            if pos == len(buf):
+                break
+            try:
+                obj, pos = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if not chunk:
+                    raise
+                break  # the rest of this object hasn't arrived yet
+            yield obj
+        buf = buf[pos:]
+        if not chunk:
+            return
+
+def stream_exiftool_source2(dest_folder, source_folder, dot_variants=True, file_filter=None, cancel=None):
+    """
+    run_exiftool_and_create_source2_csv and load_source2 in one pass for a single exiftool
+    process. exiftool holds -csv output back until every file has been read but prints -j
+    output file by file, so the Source2Store is built from its stdout while the scan is
+    still running. source2.csv is written from the same rows once exiftool finishes. With
+    file_filter, the files it keeps are passed in an argument file instead of -r *.
+    cancel is an optional ScanCancel. Returns the store.
+    """
+    output_csv = os.path.join(dest_folder, "source2.csv")
+    args = [EXIFTOOL_PATH, "-j"] + EXIFTOOL_TAGS
+    columns = [tag.lstrip("-") for tag in EXIFTOOL_TAGS]
+    rows = []
+    seen = set()
+    argfile_path = None
+    if file_filter:
+        relpaths = filter_source_files(list_source_files(source_folder), file_filter)
+        if not relpaths:
+            # exiftool treats an empty file list as an error
+            write_source2_csv(output_csv, [])
+            return Source2Store([], [], dot_variants)
+        # exiftool runs in source_folder, so the path must not be relative
+        argfile_path = os.path.abspath(os.path.join(dest_folder, EXIFTOOL_ARGFILE_NAME))
+        with open(argfile_path, "w", encoding="utf-8") as af:
+            # A leading "-" would be read as an option, so such files are passed as ./name
+            lines = ["-charset", "filename=utf8"] + [("./" + rp if rp.startswith("-") else rp) for rp in relpaths]
+            af.write("\n".join(lines) + "\n")
+        args += ["-@", argfile_path]
     else:
+        args += ["-r", "*"]
+
+    def streamed_values():
+        for obj in iter_exiftool_json(proc.stdout):
+            # List values are joined as -csv joins them
+            row = {tag: ", ".join(map(str, v)) if isinstance(v, list) else str(v) for tag, v in obj.items()}
+            if row.get("SourceFile", "").startswith("./-"):
+                row["SourceFile"] = row["SourceFile"][2:]
+            rows.append(row)
+            seen.update(row)
+            yield [row.get(col, "") for col in columns]
+
+    try:
+        proc = start_scan_process(args, cancel, cwd=source_folder, stdout=subprocess.PIPE)
+        try:
+            store = Source2Store(columns, streamed_values(), dot_variants)
+        except BaseException:
+            proc.kill()
+            raise
+        finally:
+            proc.stdout.close()
+            proc.wait()
+            scan_process_done(proc, cancel)
+    finally:
+        if argfile_path:
+            os.remove(argfile_path)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, args)
+    # Tags no file had are left out, as they are from the header of source2.csv
+    for col in columns:
+        if col not in seen:
+            del store.columns[col]
+    write_source2_csv(output_csv, rows)
+    print(f"source2.csv generated at {output_csv} ({len(rows)} files, read as exiftool streamed them)")
+    return store
+
+# Magic-byte signatures checked by probe_file_metadata: (offset, bytes, MIMEType, FileTypeExtension)
+FILE_SIGNATURES = [
+    (0, b"II*\x00", "image/tiff", "tif"),
+    (0, b"MM\x00*", "image/tiff", "tif"),
+    (0, b"II+\x00", "image/tiff", "tif"),
+    (0, b"MM\x00+", "image/tiff", "tif"),
+    (0, b"\xff\xd8\xff", "image/jpeg", "jpg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png", "png"),
+    (0, b"GIF87a", "image/gif", "gif"),
+    (0, b"GIF89a", "image/gif", "gif"),
+    (0, b"\x00\x00\x00\x0cjP  \r\n\x87\n", "image/jp2", "jp2"),
+    (0, b"8BPS", "application/vnd.adobe.photoshop", "psd"),
+    (0, b"%PDF", "application/pdf", "pdf"),
+    (8, b"WAVE", "audio/x-wav", "wav"),
+    (8, b"AVI ", "video/x-msvideo", "avi"),
+    (8, b"WEBP", "image/webp", "webp"),
+    (8, b"AIFF", "audio/x-aiff", "aif"),
+    (0, b"ID3", "audio/mpeg", "mp3"),
+    (0, b"fLaC", "audio/flac", "flac"),
+    (0, b"OggS", "audio/ogg", "ogg"),
+    (4, b"ftypM4A", "audio/mp4", "m4a"),
+    (4, b"ftypqt", "video/quicktime", "mov"),
+    (4, b"ftyp", "video/mp4", "mp4"),
+    (0, b"BM", "image/bmp", "bmp"),
+]
+
+def probe_file_metadata(source_folder, relpath):
+    """
+    Build a source2 row for one file without exiftool: MIMEType and FileTypeExtension
+    from magic bytes (falling back to the extension), PageCount for PDF and TIFF,
+    LayerCount for PSD and layered TIFF, and FileCreateDate from stat. Only headers
+    and a few small seeks are read, never the whole file.
+    """
+    path = os.path.join(source_folder, relpath)
+    try:
+        st = os.stat(path)
+        with open(path, "rb") as f:
+            head = f.read(64)
+            mime, file_ext = "", ""
+            for offset, magic, sig_mime, sig_ext in FILE_SIGNATURES:
+                if head[offset:offset + len(magic)] == magic:
+                    mime, file_ext = sig_mime, sig_ext
+                    break
+            if not mime and len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+                mime, file_ext = "audio/mpeg", "mp3"
+            ext = os.path.splitext(relpath)[1].lower().lstrip(".")
+            if not mime:
+                mime = mimetypes.guess_type(relpath)[0] or ""
+                file_ext = ext
+            page_count, layer_count = "", ""
+            try:
+                if mime == "application/pdf":
+                    page_count = _pdf_page_count(f, st.st_size)
+                elif mime == "image/tiff":
+                    page_count, layer_count = _tiff_page_and_layer_count(f, head)
+                elif mime == "application/vnd.adobe.photoshop":
+                    layer_count = _psd_layer_count(f, head)
+            except Exception:
+                # A damaged or unusual file still gets its row, just without the counts
+                pass
+    except OSError as e:
+        print(f"Could not read {relpath}: {e}")
+        return None
+
+    row = {"SourceFile": relpath, "FileName": os.path.basename(relpath)}
+    created = _file_create_time(st)
+    if created is not None:
+        row["FileCreateDate"] = _format_exif_date(created)
+    if page_count != "":
+        row["PageCount"] = str(page_count)
+    if file_ext:
+        row["FileTypeExtension"] = file_ext
+    if mime:
+        row["MIMEType"] = mime
+    if layer_count != "":
+        row["LayerCount"] = str(layer_count)
+    return row
+
+def _file_create_time(st):
+    # Birth time where the platform has one; st_ctime is creation time only on Windows
+    # (elsewhere it is the last metadata change, so the date is left out)
+    created = getattr(st, "st_birthtime", None)
+    if created is None and os.name == "nt":
+        created = st.st_ctime
+    return created
+
+def _format_exif_date(timestamp):
+    # exiftool style: 2023:05:01 10:20:30-04:00
+    stamp = datetime.fromtimestamp(timestamp).astimezone().strftime("%Y:%m:%d %H:%M:%S%z")
+    return f"{stamp[:-2]}:{stamp[-2:]}"
+
+def _tiff_page_and_layer_count(f, head):
+    """
+    Follow the IFD chain counting full-resolution pages (reduced-resolution subfiles
+    are skipped) and read the Photoshop layer count from ImageSourceData if present.
+    """
+    endian = "<" if head[:2] == b"II" else ">"
+    big = struct.unpack(endian + "H", head[2:4])[0] == 43
+    if big:
+        offset = struct.unpack(endian + "Q", head[8:16])[0]
+        count_fmt, entry_size, next_fmt = "Q", 20, "Q"
+    else:
+        offset = struct.unpack(endian + "I", head[4:8])[0]
+        count_fmt, entry_size, next_fmt = "H", 12, "I"
+    pages = 0
+    layers = ""
+    seen = set()
+    while offset and offset not in seen and len(seen) < 10000:
+        seen.add(offset)
+        f.seek(offset)
+        count = struct.unpack(endian + count_fmt, f.read(struct.calcsize(count_fmt)))[0]
+        entries = f.read(count * entry_size)
+        next_offset = struct.unpack(endian + next_fmt, f.read(struct.calcsize(next_fmt)))[0]
+        reduced = False
+        for i in range(count):
+            entry = entries[i * entry_size:(i + 1) * entry_size]
+            tag = struct.unpack(endian + "H", entry[:2])[0]
+            if tag == 254:
+                reduced = bool(_tiff_entry_value(entry, endian, big) & 1)
+            elif tag == 37724 and layers == "":
+                # UNDEFINED data: the value field holds an offset
+                value_field = entry[12:20] if big else entry[8:12]
+                data_offset = struct.unpack(endian + ("Q" if big else "I"), value_field)[0]
+                layers = _tiff_image_source_layers(f, data_offset)
+        if not reduced:
+            pages += 1
+        offset = next_offset
+    return pages, layers
+
+def _tiff_entry_value(entry, endian, big):
+    # First value of a SHORT/LONG/LONG8 entry, left-justified in the value field
+    field_type = struct.unpack(endian + "H", entry[2:4])[0]
+    value_field = entry[12:20] if big else entry[8:12]
+    value_fmt = {3: "H", 4: "I", 13: "I", 16: "Q", 18: "Q"}.get(field_type)
+    if not value_fmt:
+        return 0
+    return struct.unpack(endian + value_fmt, value_field[:struct.calcsize(value_fmt)])[0]
+
+def _tiff_image_source_layers(f, data_offset):
+    # ImageSourceData: "Adobe Photoshop Document Data Block\0" then 8BIM "Layr" <length> <int16 count>
+    # (little-endian files store the keys reversed and the numbers little-endian)
+    f.seek(data_offset)
+    block = f.read(64)
+    signature = b"Adobe Photoshop Document Data Block\x00"
+    if not block.startswith(signature):
+        return ""
+    rest = block[len(signature):]
+    if rest[:4] in (b"8BIM", b"8B64") and rest[4:8] in (b"Layr", b"Lr16", b"Lr32"):
+        endian = ">"
+    elif rest[:4] in (b"MIB8", b"46B8") and rest[4:8] in (b"ryaL", b"61rL", b"23rL"):
+        endian = "<"
+    else:
+        return ""
+    return abs(struct.unpack(endian + "h", rest[12:14])[0])
+
+def _psd_layer_count(f, head):
+    # Skip the colour mode data and image resources sections to reach the layer info count
+    psb = struct.unpack(">H", head[4:6])[0] == 2
+    f.seek(26)
+    f.seek(struct.unpack(">I", f.read(4))[0], os.SEEK_CUR)
+    f.seek(struct.unpack(">I", f.read(4))[0], os.SEEK_CUR)
+    length_size = 8 if psb else 4
+    if not f.read(length_size).strip(b"\x00"):
+        return 0
+    if not f.read(length_size).strip(b"\x00"):
+        return 0
+    return abs(struct.unpack(">h", f.read(2))[0])
+
+def _pdf_page_count(f, size):
+    """
+    Page count from the root /Pages /Count, found through the trailer and the cross-reference
+    table or stream (including objects stored inside object streams).
+    """
+    xref, trailer = _pdf_read_xref(f, size)
+    root = re.search(rb"/Root\s+(\d+)\s+\d+\s+R", trailer)
+    if not root:
+        return ""
+    root_obj = _pdf_object(f, xref, int(root.group(1)))
+    pages = re.search(rb"/Pages\s+(\d+)\s+\d+\s+R", root_obj)
+    if not pages:
+        return ""
+    count = re.search(rb"/Count\s+(\d+)", _pdf_object(f, xref, int(pages.group(1))))
+    return int(count.group(1)) if count else ""
+
+def _pdf_number(pattern, data, what):
+    # First group of a required entry, as an int
+    match = re.search(pattern, data)
+    if not match:
+        raise ValueError(f"no {what}")
+    return int(match.group(1))
+
+def _pdf_read_xref(f, size):
+    # Returns ({objnum: ("off", offset) | ("stm", stream_objnum, index)}, newest trailer dict)
+    f.seek(max(0, size - 2048))
+    tail = f.read()
+    starts = re.findall(rb"startxref\s+(\d+)", tail)
+    if not starts:
+        raise ValueError("no startxref")
+    xref = {}
+    trailer = b""
+    pending = [int(starts[-1])]
+    seen = set()
+    while pending:
+        offset = pending.pop(0)
+        if offset in seen:
+            continue
+        seen.add(offset)
+        f.seek(offset)
+        chunk = f.read(32)
+        if chunk.lstrip().startswith(b"xref"):
+            f.seek(offset + chunk.index(b"xref") + 4)
+            while True:
+                line = f.readline()
+                if not line:
+                    raise ValueError("truncated xref table")
+                if not line.strip():
+                    continue
+                if line.lstrip().startswith(b"trailer"):
+                    section_trailer = line + f.read(2048)
+                    break
+                first, count = (int(x) for x in line.split()[:2])
+                table = f.read(count * 20)
+                for i in range(count):
+                    entry = table[i * 20:(i + 1) * 20].split()
+                    if len(entry) == 3 and entry[2] == b"n":
+                        xref.setdefault(first + i, ("off", int(entry[0])))
+            section_trailer = section_trailer[:section_trailer.find(b"startxref")] if b"startxref" in section_trailer else section_trailer
+            extra = re.search(rb"/XRefStm\s+(\d+)", section_trailer)
+            if extra:
+                pending.insert(0, int(extra.group(1)))
+        else:
+            stream_dict, data = _pdf_stream_at(f, offset, xref)
+            section_trailer = stream_dict
+            widths = re.search(rb"/W\s*\[\s*([\d\s]+)\]", stream_dict)
+            if not widths:
+                raise ValueError("no /W in xref stream")
+            widths = [int(x) for x in widths.group(1).split()]
+            index = re.search(rb"/Index\s*\[\s*([\d\s]+)\]", stream_dict)
+            if index:
+                nums = [int(x) for x in index.group(1).split()]
+            else:
+                nums = [0, _pdf_number(rb"/Size\s+(\d+)", stream_dict, "/Size")]
+            row_size = sum(widths)
+            pos = 0
+            for first, count in zip(nums[0::2], nums[1::2]):
+                for objnum in range(first, first + count):
+                    fields = []
+                    for w in widths:
+                        fields.append(int.from_bytes(data[pos:pos + w], "big") if w else None)
+                        pos += w
+                    kind = fields[0] if fields[0] is not None else 1
+                    if kind == 1:
+                        xref.setdefault(objnum, ("off", fields[1]))
+                    elif kind == 2:
+                        xref.setdefault(objnum, ("stm", fields[1], fields[2]))
+            if pos > len(data) or row_size == 0:
+                raise ValueError("bad xref stream")
+        if not trailer:
+            trailer = section_trailer
+        prev = re.search(rb"/Prev\s+(\d+)", section_trailer)
+        if prev:
+            pending.append(int(prev.group(1)))
+    return xref, trailer
+
+_PDF_OBJECT_END_RE = re.compile(rb"endobj|stream")
+
+def _pdf_object(f, xref, objnum):
+    # Raw bytes of an object body, read from the file or from its object stream
+    entry = xref.get(objnum)
+    if not entry:
+        return b""
+    if entry[0] == "off":
+        # Up to endobj however long it is (a /Pages object may list thousands of /Kids
+        # before its /Count), or to the data of a stream object
+        f.seek(entry[1])
+        body = b""
+        while True:
+            chunk = f.read(65536)
+            body += chunk
+            end = _PDF_OBJECT_END_RE.search(body, max(0, len(body) - len(chunk) - 8))
+            if end:
+                return body[:end.start()]
+            if not chunk:
+                return body
+    stream_dict, data = _pdf_stream_at(f, xref[entry[1]][1], xref)
+    count = _pdf_number(rb"/N\s+(\d+)", stream_dict, "/N")
+    first = _pdf_number(rb"/First\s+(\d+)", stream_dict, "/First")
+    header = [int(x) for x in data[:first].split()[:count * 2]]
+    offsets = header[1::2]
+    idx = entry[2]
+    start = first + offsets[idx]
+    end = first + offsets[idx + 1] if idx + 1 < len(offsets) else len(data)
+    return data[start:end]
+
+def _pdf_stream_at(f, offset, xref):
+    # (dictionary bytes, decoded stream bytes) for the stream object at offset
+    f.seek(offset)
+    chunk = f.read(4096)
+    stream_pos = chunk.find(b"stream")
+    if stream_pos < 0:
+        raise ValueError("no stream")
+    stream_dict = chunk[:stream_pos]
+    length = re.search(rb"/Length\s+(\d+)(\s+\d+\s+R)?", stream_dict)
+    if not length:
+        raise ValueError("no /Length")
+    if length.group(2):
+        length_obj = _pdf_object(f, xref, int(length.group(1)))
+        length_value = _pdf_number(rb"obj\s+(\d+)", length_obj, "/Length value")
+    else:
+        length_value = int(length.group(1))
+    data_start = offset + stream_pos + len(b"stream")
+    f.seek(data_start)
+    lead = f.read(2)
+    data_start += 2 if lead == b"\r\n" else 1 if lead[:1] in (b"\r", b"\n") else 0
+    f.seek(data_start)
+    data = f.read(length_value)
+    if b"/FlateDecode" in stream_dict:
+        data = zlib.decompress(data)
+    predictor = re.search(rb"/Predictor\s+(\d+)", stream_dict)
+    if predictor and int(predictor.group(1)) >= 10:
+        columns = int(re.search(rb"/Columns\s+(\d+)", stream_dict).group(1))
+        data = _png_unpredict(data, columns)
+    return stream_dict, data
+
+def _png_unpredict(data, columns):
+    # Undo PNG row filters (xref streams use "Up", but any filter byte is handled)
+    out = bytearray()
+    prev = bytearray(columns)
+    for i in range(0, len(data), columns + 1):
+        filter_type = data[i]
+        row = bytearray(data[i + 1:i + 1 + columns])
+        for j in range(len(row)):
+            left = row[j - 1] if j else 0
+            up = prev[j]
+            if filter_type == 1:
+                row[j] = (row[j] + left) & 0xFF
+            elif filter_type == 2:
+                row[j] = (row[j] + up) & 0xFF
+            elif filter_type == 3:
+                row[j] = (row[j] + (left + up) // 2) & 0xFF
+            elif filter_type == 4:
+                up_left = prev[j - 1] if j else 0
+                p = left + up - up_left
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - up_left)
+                row[j] = (row[j] + (left if pa <= pb and pa <= pc else up if pb <= pc else up_left)) & 0xFF
+        out += row
+        prev = row
+    return bytes(out)
+
+def find_clipboard_zip(source_dir):
+    # The first zip by name, so a folder holding several exports always gives the same one
+    zips = sorted(fname for fname in os.listdir(source_dir) if fname.lower().endswith('.zip'))
+    if not zips:
         raise FileNotFoundError("No zip file found in the source directory.")
+    if len(zips) > 1:
+        print(f"Several zip files found; using {zips[0]} (ignoring {', '.join(zips[1:])}). Pass the zip path to choose another.")
+    return os.path.join(source_dir, zips[0])
+
+def find_csv_member(zip_ref):
+    for name in zip_ref.namelist():
+        if name.lower().endswith('.csv'):
+            return name
     raise FileNotFoundError("No CSV file found in the zip archive.")
 
-def load_source2(source2_path):
-    # Expanded logic: any "_" between two digits is treated as "."
-    mapping = {}
-    with open(source2_path, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            for keyfield in ["SourceFile", "FileName"]:
-                key = row.get(keyfield, "")
+def extract_and_rename_zip(source_dir, zip_path=None):
+    # zip_path extracts a specific clipboard export into source_dir instead of the first zip found there
+    if zip_path is None:
+        zip_path = find_clipboard_zip(source_dir)
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        extracted_name = find_csv_member(zip_ref)
+        zip_ref.extractall(source_dir)
+        src = os.path.join(source_dir, extracted_name)
+        dst = os.path.join(source_dir, 'source1.csv')
+        if os.path.basename(src) != 'source1.csv':
+            os.rename(src, dst)
+        else:
+            dst = src
+        print(f"Extracted and renamed {extracted_name} to source1.csv")
+        return dst
+
+@contextlib.contextmanager
+def open_source1(source1_path):
+    """
+    Open source1 as text for csv. A .zip path is read from its CSV member through
+    ZipFile.open, so nothing in the clipboard export is written to disk.
+    """
+    if source1_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(source1_path, 'r') as zip_ref:
+            with zip_ref.open(find_csv_member(zip_ref)) as member:
+                yield io.TextIOWrapper(member, encoding='utf-8', newline='')
+    else:
+        with open(source1_path, newline='', encoding='utf-8') as f1:
+            yield f1
+
+# Matching helpers run once per source1 row or source2 key, and the same shelf locators and
+# filenames come up again and again, so their patterns are compiled once and their results
+# kept in a bounded LRU cache.
+NORMALIZE_CACHE_SIZE = 65536
+_DIGIT_UNDERSCORE_RE = re.compile(r'(?<=\d)_(?=\d)')
+_LOCATION_PUNCT_RE = re.compile(r"[ .-]")
+_SOURCEFILE_PUNCT_RE = re.compile(r"[.-]")
+_SEPARATORS_RE = re.compile(r"[._\-]")
+_WHITESPACE_RE = re.compile(r"\s+")
+_SR_MI_RE = re.compile(r"^(SR|MI)\s*(\d+)\.(\d+)")
+_BULLET_RE = re.compile(r"^\*\s*")
+_SIDE_LABELS = tuple(["SideA", "SideB", "Side1", "Side2"] + [f"Tape{i}" for i in range(1, 11)])
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def dot_mapped(name):
+    # MI12_3.tif -> MI12.3.tif: any "_" between two digits becomes "."
+    return _DIGIT_UNDERSCORE_RE.sub('.', name)
+
+class Source2Record:
+    """
+    One source2.csv row. Values are kept in a tuple in column order and read by name with
+    .get() or [] like a csv.DictReader row; the column -> position map is shared by every
+    record of a file.
+    """
+    __slots__ = ("_columns", "_values")
+
+    def __init__(self, columns, values):
+        self._columns = columns
+        self._values = values
+
+    def get(self, field, default=None):
+        i = self._columns.get(field)
+        return default if i is None else self._values[i]
+
+    def __getitem__(self, field):
+        return self._values[self._columns[field]]
+
+    def __contains__(self, field):
+        return field in self._columns
+
+    def __repr__(self):
+        return f"Source2Record({dict(zip(self._columns, self._values))!r})"
+
+class Source2Store:
+    """
+    source2.csv rows, each stored once in records, plus a key -> record index map for
+    SourceFile, FileName and (with dot_variants) their dot-mapped forms. Reads like the
+    old key -> row dict (keys, items, values, [key], in); records holds the rows that are
+    still reachable from a key, in the order the keys first reach them, so consumers can
+    walk it without deduplicating.
+    """
+    def __init__(self, header, rows, dot_variants=True):
+        # Later duplicate column names win, as with csv.DictReader
+        columns = {name: i for i, name in enumerate(header)}
+        width = len(header)
+        mime_col = columns.get("MIMEType")
+        key_cols = [columns[k] for k in ("SourceFile", "FileName") if k in columns]
+        # Other columns repeat a lot (dates, file types, page counts), so equal values share one string
+        shared_cols = [i for i in range(width) if i not in key_cols and i != mime_col]
+        shared = {}
+        loaded = []
+        key_index = {}
+        for values in rows:
+            if not values:
+                continue
+            # Short rows read as None, extra values are dropped (DictReader's restval/restkey)
+            if len(values) < width:
+                values = values + [None] * (width - len(values))
+            elif len(values) > width:
+                values = values[:width]
+            if mime_col is not None and values[mime_col]:
+                values[mime_col] = sys.intern(values[mime_col])
+            for col in shared_cols:
+                values[col] = shared.setdefault(values[col], values[col])
+            idx = len(loaded)
+            loaded.append(tuple(values))
+            for col in key_cols:
+                key = values[col]
                 if key:
-                    mapping[key] = row
+                    key_index[key] = idx
                     # Add dot-mapped version if applicable (e.g. MI12_3.tif --> MI12.3.tif)
-                    dot_key = re.sub(r'(?<=\d)_(?=\d)', '.', key)
-                    if dot_key != key:
-                        mapping[dot_key] = row
-    return mapping
+                    # (uncached: keys are unique, so caching them would only hold memory)
+                    if dot_variants:
+                        dot_key = _DIGIT_UNDERSCORE_RE.sub('.', key)
+                        if dot_key != key:
+                            key_index[dot_key] = idx
+        # Renumber in key order; rows whose keys were all taken over by later rows are dropped
+        order = {}
+        for idx in key_index.values():
+            if idx not in order:
+                order[idx] = len(order)
+        self.columns = columns
+        self.records = [Source2Record(columns, loaded[idx]) for idx in order]
+        self.key_index = {key: order[idx] for key, idx in key_index.items()}
+        self._indexes = {}
+
+    def __getstate__(self):
+        # Worker processes build their own matcher indexes rather than unpickling them
+        state = dict(self.__dict__)
+        state["_indexes"] = {}
+        return state
+
+    def __len__(self):
+        return len(self.key_index)
+
+    def __iter__(self):
+        return iter(self.key_index)
+
+    def __contains__(self, key):
+        return key in self.key_index
+
+    def __getitem__(self, key):
+        return self.records[self.key_index[key]]
+
+    def get(self, key, default=None):
+        idx = self.key_index.get(key)
+        return default if idx is None else self.records[idx]
+
+    def keys(self):
+        return self.key_index.keys()
+
+    def items(self):
+        records = self.records
+        return ((key, records[idx]) for key, idx in self.key_index.items())
+
+    def values(self):
+        records = self.records
+        return (records[idx] for idx in self.key_index.values())
+
+    def column_by_key(self, field):
+        # {key: value of field} for every key, e.g. the MIME type of each file name
+        col = self.columns.get(field)
+        if col is None:
+            return dict.fromkeys(self.key_index)
+        values = [record._values[col] for record in self.records]
+        return {key: values[idx] for key, idx in self.key_index.items()}
+
+    # The lookup structures of the matchers, built in memory on first use and then shared
+    # (Source2Index answers the same calls from its SQLite file)
+    def _index(self, name, build):
+        index = self._indexes.get(name)
+        if index is None:
+            index = self._indexes[name] = build()
+        return index
+
+    def compound_index(self):
+        return self._index("compound", lambda: CompoundIndex(self))
+
+    def dot_index(self):
+        return self._index("dot", lambda: DotBaseIndex(self))
+
+    def match_keys(self):
+        return self._index("match_keys", lambda: tuple(_MatchKeys(first) for first in _match_key_positions(self.records)))
+
+    def build_indexes(self):
+        # Build every matcher index now, e.g. in a background thread before matching starts
+        self.compound_index()
+        self.dot_index()
+        self.match_keys()
+
+def load_source2(source2_path, dot_variants=True):
+    # Expanded logic: any "_" between two digits is treated as "."
+    with open(source2_path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        return Source2Store(header, reader, dot_variants)
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize_location(loc):
-    return re.sub(r"[ .-]", "", loc).lower()
+    return _LOCATION_PUNCT_RE.sub("", loc).lower()
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize_sourcefile(sf):
-    return re.sub(r"[.-]", "", sf).lower()
+    return _SOURCEFILE_PUNCT_RE.sub("", sf).lower()
 
-def sr_mi_dot_match(phys_obj_loc, source2_mapping):
-    match = re.match(r"^(SR|MI)\s*(\d+)\.(\d+)", phys_obj_loc)
+def _dot_base(key):
+    return _DIGIT_UNDERSCORE_RE.sub('.', key).rsplit('.', 1)[0].lower()
+
+class DotBaseIndex:
+    """
+    Sorted dot-mapped, lowercased base names (extension removed) of every source2 mapping
+    key, so sr_mi_dot_match finds the first key starting with "sr1267.435" (and not
+    "sr1267.4351") by bisecting instead of rewriting every key for every row.
+    """
+    def __init__(self, source2_mapping):
+        entries = []
+        for pos, key in enumerate(source2_mapping.key_index):
+            entries.append((_dot_base(key), pos))
+        entries.sort()
+        self.records = source2_mapping.records
+        self.record_ids = list(source2_mapping.key_index.values())
+        self.bases = [e[0] for e in entries]
+        self.first_pos = _RangeMin([e[1] for e in entries])
+
+    def first_with_prefix(self, prefix):
+        # Row of the first key (in mapping order) whose base starts with prefix, not
+        # followed by another digit, or None
+        lo, hi = _prefix_range(self.bases, prefix)
+        digits_lo = bisect_left(self.bases, prefix + "0", lo, hi)
+        digits_hi = bisect_left(self.bases, prefix + ":", digits_lo, hi)
+        pos = min(self.first_pos.query(lo, digits_lo), self.first_pos.query(digits_hi, hi))
+        if pos == _NO_MATCH:
+            return None
+        return self.records[self.record_ids[pos]]
+
+def sr_mi_dotted_locator(phys_obj_loc):
+    # "SR 1267.435 box 2" -> "sr1267.435", the base name prefix sr_mi_dot_match looks for
+    match = _SR_MI_RE.match(phys_obj_loc)
     if match:
         prefix = match.group(1)
         main_num = match.group(2)
         sub_num = match.group(3)
-        dotted_loc = f"{prefix}{main_num}.{sub_num}".lower()
-        for key in source2_mapping:
-            mod_key = re.sub(r'(?<=\d)_(?=\d)', '.', key)
-            mod_key_base = mod_key.rsplit('.', 1)[0].lower()
-            if mod_key_base.startswith(dotted_loc):
-                return source2_mapping[key]
+        return f"{prefix}{main_num}.{sub_num}".lower()
+    return None
+
+def sr_mi_dot_match(phys_obj_loc, source2_mapping, dot_index=None):
+    dotted_loc = sr_mi_dotted_locator(phys_obj_loc)
+    if dotted_loc:
+        if dot_index is None and isinstance(source2_mapping, dict):
+            for key, row in source2_mapping.items():
+                base = _dot_base(key)
+                if base.startswith(dotted_loc) and not "0" <= base[len(dotted_loc):len(dotted_loc) + 1] <= "9":
+                    return row
+            return None
+        if dot_index is None:
+            dot_index = source2_mapping.dot_index()
+        return dot_index.first_with_prefix(dotted_loc)
     return None
 
 def normalize_audio_shelf(shelf_locator):
@@ -89,68 +1188,119 @@ def normalize_audio_shelf(shelf_locator):
     # E.g., "SR 1267.435" -> "SR1267_435"
     return shelf_locator.replace(" ", "").replace(".", "_")
 
+@lru_cache(maxsize=4096)
+def _side_label_patterns(normalized_audio_prefix):
+    # (side pattern, prefix pattern) for one shelf locator, shared by all of its children
+    escaped = re.escape(normalized_audio_prefix)
+    return (re.compile(rf"{escaped}[-_][^-_]*[-_](Side[A-Za-z0-9]+)$", re.IGNORECASE),
+            re.compile(rf"^{escaped}[-_]*", re.IGNORECASE))
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def extract_side_label(sourcefile, normalized_audio_prefix):
     # Extract SideLabel, e.g. "SideA", "SideB", "Side1", "Side2", "Tape1" etc. from SourceFile after the shelf locator
     # Example: SR1267_435-PhilBrown-CFRCReminiscences1-SideA.mp3 -> "SideA"
     if not sourcefile:
         return ""
     base = os.path.splitext(os.path.basename(sourcefile))[0]
+    side_pattern, pref_pattern = _side_label_patterns(normalized_audio_prefix)
     # attempt pattern: prefix-...-SideA
-    pattern = rf"{re.escape(normalized_audio_prefix)}[-_][^-_]*[-_](Side[A-Za-z0-9]+)$"
-    match = re.search(pattern, base, re.IGNORECASE)
+    match = side_pattern.search(base)
     if match:
         return match.group(1)
     # fallback: common endings
-    for label in ["SideA", "SideB", "Side1", "Side2"] + [f"Tape{i}" for i in range(1, 11)]:
+    for label in _SIDE_LABELS:
         if base.lower().endswith(label.lower()):
             return base[-len(label):]
     # final fallback: return substring after prefix if present
-    pref_pattern = rf"^{re.escape(normalized_audio_prefix)}[-_]*"
-    after_prefix = re.sub(pref_pattern, "", base, flags=re.IGNORECASE)
+    after_prefix = pref_pattern.sub("", base)
     if after_prefix:
         after_prefix = after_prefix.lstrip("-_")
         return after_prefix
     return ""
 
-def is_compound(row, source2_mapping):
+def _compound_stem(s2key):
+    # s2key may be full path or filename; get basename without extension
+    return os.path.splitext(os.path.basename(s2key))[0].lower()
+
+class CompoundIndex:
     """
-    Detect image/audio children for a given source1 row by scanning source2 mapping.
-    Returns (image_children_list, audio_children_list).
+    Sorted index of lowercased basename stems for every source2 mapping key.
+    Built once per run so is_compound can find children by prefix with a bisect
+    instead of walking the whole mapping for every source1 row.
     """
+    def __init__(self, source2_mapping):
+        entries = []
+        for pos, (s2key, record_idx) in enumerate(source2_mapping.key_index.items()):
+            entries.append((_compound_stem(s2key), pos, record_idx))
+        entries.sort(key=lambda e: (e[0], e[1]))
+        self.records = source2_mapping.records
+        self.stems = [e[0] for e in entries]
+        self.positions = [e[1] for e in entries]
+        self.record_ids = [e[2] for e in entries]
+
+    def children(self, prefixes):
+        # Collect every key whose stem starts with one of the prefixes, then restore
+        # mapping order so the result matches a linear scan of source2_mapping.
+        hits = {}
+        for prefix in prefixes:
+            i = bisect_left(self.stems, prefix)
+            while i < len(self.stems) and self.stems[i].startswith(prefix):
+                hits[self.positions[i]] = self.record_ids[i]
+                i += 1
+        children = []
+        seen = set()
+        for pos in sorted(hits):
+            record_idx = hits[pos]
+            if record_idx not in seen:
+                seen.add(record_idx)
+                children.append(self.records[record_idx])
+        return children
+
+def compound_prefixes(row):
+    # Lowercased stem prefixes of a source1 row's compound children, e.g. "sr1267_435-"
     phys_obj_loc = (row.get('physicalObjectLocation') or '').strip()
     shelf_locator = (row.get('physicalObjectLocation') or row.get('shelf_locator') or row.get('shelfLocator') or '').strip()
     norm_phys_obj_loc = phys_obj_loc.replace(".", "_").replace(" ", "")
     norm_shelf_locator = normalize_audio_shelf(shelf_locator)
 
+    prefixes = []
+    for norm in (norm_phys_obj_loc, norm_shelf_locator):
+        for sep in ("-", "_"):
+            prefix = (norm + sep).lower()
+            if prefix not in prefixes:
+                prefixes.append(prefix)
+    return prefixes
+
+def is_compound(row, source2_mapping, compound_index=None):
+    """
+    Detect image/audio children for a given source1 row by looking up source2 mapping keys
+    whose basename starts with the normalized shelf locator.
+    Returns (image_children_list, audio_children_list). A plain dict of key -> row is
+    scanned key by key.
+    """
+    prefixes = compound_prefixes(row)
+    if compound_index is not None:
+        children = compound_index.children(prefixes)
+    elif isinstance(source2_mapping, dict):
+        children = list({id(s2row): s2row for s2key, s2row in source2_mapping.items()
+                         if _compound_stem(s2key).startswith(tuple(prefixes))}.values())
+    else:
+        children = source2_mapping.compound_index().children(prefixes)
     image_children = []
     audio_children = []
-    seen_rows = set()
-    for s2key, s2row in source2_mapping.items():
-        # s2key may be full path or filename; get basename without extension
-        cand = os.path.splitext(os.path.basename(s2key))[0]
-        if cand.lower().startswith((norm_phys_obj_loc + "-").lower()) or cand.lower().startswith((norm_phys_obj_loc + "_").lower()):
-            if id(s2row) not in seen_rows:
-                seen_rows.add(id(s2row))
-                mt = s2row.get('MIMEType', '').lower()
-                if mt.startswith('image/'):
-                    image_children.append(s2row)
-                elif mt.startswith('audio/'):
-                    audio_children.append(s2row)
-        elif cand.lower().startswith((norm_shelf_locator + "-").lower()) or cand.lower().startswith((norm_shelf_locator + "_").lower()):
-            if id(s2row) not in seen_rows:
-                seen_rows.add(id(s2row))
-                mt = s2row.get('MIMEType', '').lower()
-                if mt.startswith('image/'):
-                    image_children.append(s2row)
-                elif mt.startswith('audio/'):
-                    audio_children.append(s2row)
+    for s2row in children:
+        mt = s2row.get('MIMEType', '').lower()
+        if mt.startswith('image/'):
+            image_children.append(s2row)
+        elif mt.startswith('audio/'):
+            audio_children.append(s2row)
     return (image_children, audio_children)
 
 def reformat_extent_and_medium(extent_and_medium):
     if not extent_and_medium:
         return ""
     parts = [
-        re.sub(r"^\*\s*", "", line).strip()
+        _BULLET_RE.sub("", line).strip()
         for line in extent_and_medium.split("\n")
         if line.strip()
     ]
@@ -170,7 +1320,29 @@ def get_model_and_resource_type(mime):
     else:
         return ("Other", "Other")
 
-def write_error_report(error_rows, blank_rows, error_path, product_header):
+# Product columns that must not be blank; a row needs one of the two parent columns,
+# and a mime whenever it has a digital_file
+REQUIRED_PRODUCT_FIELDS = ['ID', 'model', 'title', 'resource_type']
+
+def missing_required_fields(product_header, product_row):
+    vals = dict(zip(product_header, product_row))
+    missing = [name for name in REQUIRED_PRODUCT_FIELDS if not vals.get(name)]
+    if not vals.get('member_of_existing_entity_id') and not vals.get('member_of'):
+        missing.append('member_of_existing_entity_id/member_of')
+    if vals.get('digital_file') and not vals.get('mime'):
+        missing.append('mime')
+    return missing
+
+ERROR_CSV_HEADER = ['problem', 'source_row', 'product_row', 'ID', 'referenceCode', 'physicalObjectLocation',
+                    'title', 'missing_fields']
+
+def write_error_report(error_rows, blank_rows, error_path, product_header, error_csv_path=None):
+    """
+    error_rows are source1 rows that could not be matched ("rownum" is the source1.csv row,
+    header = row 1); blank_rows are product rows missing required fields ("rownum" is the
+    product.csv row, "source_row" the source1.csv row it came from). The same entries are
+    written to error_csv_path when given.
+    """
     with open(error_path, 'w', encoding='utf-8') as ef:
         ef.write("Rows from source1.csv that could not be matched to source2.csv:\n")
         for err in error_rows:
@@ -178,129 +1350,936 @@ def write_error_report(error_rows, blank_rows, error_path, product_header):
         ef.write("\nRows in product.csv with blank fields:\n")
         for blank in blank_rows:
             vals = dict(zip(product_header, blank['values']))
-            member_of_existing_entity_id = vals.get('member_of_existing_entity_id', '')
-            member_of = vals.get('member_of', '')
-            # Only report if BOTH are blank, or BOTH are filled
-            if (not member_of_existing_entity_id and not member_of) or (member_of_existing_entity_id and member_of):
-                ef.write(f"Row {blank['rownum']} is missing fields: {', '.join(blank['fields'])}\n")
-                ef.write(f"Values: {vals}\n")
-
+            source_row = f" (source1.csv row {blank['source_row']})" if blank.get('source_row') else ""
+            ef.write(f"Row {blank['rownum']}{source_row} is missing fields: {', '.join(blank['fields'])}\n")
+            ef.write(f"Values: {vals}\n")
+
+    if error_csv_path:
+        with open(error_csv_path, 'w', newline='', encoding='utf-8') as cf:
+            writer = csv.writer(cf)
+            writer.writerow(ERROR_CSV_HEADER)
+            for err in error_rows:
+                writer.writerow(['unmatched', err.get('rownum', ''), err.get('product_row', ''), err.get('ID', ''),
+                                 err.get('referenceCode', ''), err.get('physicalObjectLocation', ''),
+                                 err.get('title', ''), ''])
+            for blank in blank_rows:
+                vals = dict(zip(product_header, blank['values']))
+                writer.writerow(['blank_fields', blank.get('source_row', ''), blank['rownum'], vals.get('ID', ''),
+                                 vals.get('local_identifier', ''), vals.get('shelf_locator', ''),
+                                 vals.get('title', ''), '; '.join(blank['fields'])])
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def _normalize_for_matching(s):
+    # Returns a tuple, since the cached value is shared between callers
     if not s:
-        return []
+        return ()
     s = s.lower()
     variants = []
-    no_space = re.sub(r"\s+", "", s)
+    no_space = _WHITESPACE_RE.sub("", s)
     variants.append(no_space)
     variants.append(no_space.replace(".", "_"))
     variants.append(no_space.replace("_", "."))
-    variants.append(re.sub(r"[._\-]", "", no_space))
-    digits_dot = re.sub(r"(?<=\d)_(?=\d)", ".", no_space)
+    variants.append(_SEPARATORS_RE.sub("", no_space))
+    digits_dot = dot_mapped(no_space)
     variants.append(digits_dot)
     # unique preserve order
     uniq = []
     for v in variants:
         if v and v not in uniq:
             uniq.append(v)
-    return uniq
+    return tuple(uniq)
+
+_NO_MATCH = float("inf")
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _compact(s):
+    return _SEPARATORS_RE.sub("", s)
+
+def _prefix_range(sorted_keys, prefix):
+    # Index range [lo, hi) of the keys that start with prefix
+    lo = bisect_left(sorted_keys, prefix)
+    if not prefix:
+        return lo, len(sorted_keys)
+    last = ord(prefix[-1])
+    if last < 0x10FFFF:
+        return lo, bisect_left(sorted_keys, prefix[:-1] + chr(last + 1), lo)
+    hi = lo
+    while hi < len(sorted_keys) and sorted_keys[hi].startswith(prefix):
+        hi += 1
+    return lo, hi
+
+class _RangeMin:
+    """Segment tree answering min(values[lo:hi]) in O(log n) from 2n slots."""
+    def __init__(self, values):
+        self.size = len(values)
+        self.tree = [_NO_MATCH] * self.size + list(values)
+        for i in range(self.size - 1, 0, -1):
+            self.tree[i] = min(self.tree[2 * i], self.tree[2 * i + 1])
+
+    def query(self, lo, hi):
+        best = _NO_MATCH
+        tree = self.tree
+        lo += self.size
+        hi += self.size
+        while lo < hi:
+            if lo & 1:
+                best = min(best, tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                best = min(best, tree[hi])
+            lo >>= 1
+            hi >>= 1
+        return best
+
+class _MatchKeys:
+    """
+    Distinct candidate strings of one normal form (lowercase or compact), each with the
+    position of the first image row and first audio row that produced it.
+    """
+    GRAM = 3
+
+    def __init__(self, first_pos):
+        self.first_pos = first_pos
+        self.sorted_keys = sorted(first_pos)
+        self.range_min = []
+        self.by_pos = []
+        self.grams = []
+        for kind in (0, 1):
+            self.range_min.append(_RangeMin([first_pos[k][kind] for k in self.sorted_keys]))
+            # Keys holding a row of this kind, ordered by that row's position
+            keys = sorted((k for k in first_pos if first_pos[k][kind] != _NO_MATCH), key=lambda k: first_pos[k][kind])
+            self.by_pos.append(keys)
+            postings = {}
+            for k in keys:
+                for gram in {k[i:i + self.GRAM] for i in range(len(k) - self.GRAM + 1)}:
+                    postings.setdefault(gram, []).append(k)
+            self.grams.append(postings)
+
+    def exact(self, s, kind):
+        hit = self.first_pos.get(s)
+        return hit[kind] if hit else _NO_MATCH
+
+    def with_prefix(self, prefix, kind):
+        # First row whose key starts with prefix
+        lo, hi = _prefix_range(self.sorted_keys, prefix)
+        return self.range_min[kind].query(lo, hi)
+
+    def prefix_of(self, s, kind):
+        # First row whose key is a prefix of s
+        return min(self.exact(s[:i], kind) for i in range(len(s) + 1))
+
+    def containing(self, s, kind):
+        # First row whose key contains s
+        if not s:
+            return self.range_min[kind].query(0, len(self.sorted_keys))
+        if len(s) < self.GRAM:
+            keys = self.by_pos[kind]
+        else:
+            postings = self.grams[kind]
+            keys = min((postings.get(s[i:i + self.GRAM], ()) for i in range(len(s) - self.GRAM + 1)), key=len)
+        for k in keys:
+            if s in k:
+                return self.first_pos[k][kind]
+        return _NO_MATCH
+
+    def contained_in(self, s, kind):
+        # First row whose key is a substring of s
+        best = _NO_MATCH
+        for i in range(len(s) + 1):
+            for j in range(i, len(s) + 1):
+                best = min(best, self.exact(s[i:j], kind))
+        return best
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _match_variants(phys_obj_loc, shelf_locator):
+    # Lowered and compacted search strings for one (physicalObjectLocation, shelf locator) pair
+    variants = []
+    for v in _normalize_for_matching(phys_obj_loc) + _normalize_for_matching(shelf_locator):
+        v = v.lower()
+        if v not in variants:
+            variants.append(v)
+    compacts = []
+    for v in variants:
+        v_compact = _compact(v)
+        if v_compact not in compacts:
+            compacts.append(v_compact)
+    return tuple(variants), tuple(compacts)
+
+def _match_key_positions(records):
+    """
+    Lowercased and compacted candidate stems of the image and audio records, each mapped
+    to [position of the first image record, of the first audio record] that produced it.
+    """
+    low_first = {}
+    compact_first = {}
+    for pos, row in enumerate(records):
+        mt = (row.get('MIMEType') or '').lower()
+        if mt.startswith('image/'):
+            kind = 0
+        elif mt.startswith('audio/'):
+            kind = 1
+        else:
+            continue
+        for cand in _candidate_stems(row):
+            cand_low = cand.lower()
+            for first, key in ((low_first, cand_low), (compact_first, _compact(cand_low))):
+                hit = first.setdefault(key, [_NO_MATCH, _NO_MATCH])
+                if pos < hit[kind]:
+                    hit[kind] = pos
+    return low_first, compact_first
 
-def find_best_direct_matches(phys_obj_loc, shelf_locator, source2_mapping):
+class DirectMatcher:
+    """
+    Precomputed candidate forms for every source2 row, answering the exact, startswith
+    and substring passes of find_best_direct_matches by lookup instead of full scans.
+    The first image and first audio row (in source2 mapping order) of the earliest pass
+    that matches is returned, as the original scans did.
+    """
+    def __init__(self, source2_mapping):
+        # Unique rows in mapping order
+        self.rows = source2_mapping.records
+        self.low, self.compact = source2_mapping.match_keys()
+        # Rows found by each pass, for the run report
+        self.hits = {"exact": 0, "prefix": 0, "substring": 0}
+
+    def find(self, phys_obj_loc, shelf_locator):
+        variants, compacts = _match_variants(phys_obj_loc, shelf_locator)
+
+        passes = [
+            # Pass 1: exact normalized equality
+            ("exact", lambda kind: min(self.compact.exact(v, kind) for v in compacts)),
+            # Pass 2: startswith (permissive)
+            ("prefix", lambda kind: min(
+                min(min(self.low.with_prefix(v, kind), self.low.prefix_of(v, kind)) for v in variants),
+                min(min(self.compact.with_prefix(v, kind), self.compact.prefix_of(v, kind)) for v in compacts),
+            )),
+            # Pass 3: substring
+            ("substring", lambda kind: min(
+                min(min(self.low.containing(v, kind), self.low.contained_in(v, kind)) for v in variants),
+                min(min(self.compact.containing(v, kind), self.compact.contained_in(v, kind)) for v in compacts),
+            )),
+        ]
+        if not variants:
+            return (None, None)
+        best = [None, None]
+        for pass_name, match_pass in passes:
+            for kind in (0, 1):
+                if best[kind] is None:
+                    pos = match_pass(kind)
+                    if pos != _NO_MATCH:
+                        best[kind] = self.rows[pos]
+                        self.hits[pass_name] += 1
+            if best[0] and best[1]:
+                break
+        return (best[0], best[1])
+
+def _candidate_stems(row):
+    # candidate basenames (SourceFile and FileName without extension), deduped
+    candidates = []
+    sf = row.get('SourceFile') or ""
+    fn = row.get('FileName') or ""
+    if sf:
+        candidates.append(os.path.splitext(os.path.basename(sf))[0])
+    if fn:
+        candidates.append(os.path.splitext(os.path.basename(fn))[0])
+    seen = []
+    for c in candidates:
+        if c and c not in seen:
+            seen.append(c)
+    return seen
+
+def find_best_direct_matches(phys_obj_loc, shelf_locator, source2_mapping, matcher=None):
     """
     Broad matching logic:
     Returns (best_image_row, best_audio_row) or (None, None)
+    Without a matcher, a Source2Store builds one on its cached match keys; a plain dict of
+    key -> row is scanned row by row.
     """
-    phys_variants = _normalize_for_matching(phys_obj_loc)
-    shelf_variants = _normalize_for_matching(shelf_locator)
-
-    # Unique rows to check
-    rows_to_check = list({id(v): v for v in source2_mapping.values()}.values())
-
-    best_image = None
-    best_audio = None
-
-    # helper to produce candidate basenames and compact form
-    def cand_forms(row):
-        candidates = []
-        sf = row.get('SourceFile') or ""
-        fn = row.get('FileName') or ""
-        if sf:
-            candidates.append(os.path.splitext(os.path.basename(sf))[0])
-        if fn:
-            candidates.append(os.path.splitext(os.path.basename(fn))[0])
-        # dedupe
-        seen = []
-        for c in candidates:
-            if c and c not in seen:
-                seen.append(c)
-        return seen
-
-    # Pass 1: exact normalized equality
-    for row in rows_to_check:
-        for cand in cand_forms(row):
-            cand_compact = re.sub(r"[._\-]", "", cand).lower()
-            for var in phys_variants + shelf_variants:
-                if re.sub(r"[._\-]", "", var).lower() == cand_compact:
-                    mt = (row.get('MIMEType') or '').lower()
-                    if mt.startswith('image/') and not best_image:
-                        best_image = row
-                    elif mt.startswith('audio/') and not best_audio:
-                        best_audio = row
-            if best_image and best_audio:
-                return (best_image, best_audio)
-
-    # Pass 2: startswith (permissive)
-    for row in rows_to_check:
-        for cand in cand_forms(row):
-            cand_low = cand.lower()
-            cand_compact = re.sub(r"[._\-]", "", cand_low)
-            for var in phys_variants + shelf_variants:
-                v = var.lower()
-                v_compact = re.sub(r"[._\-]", "", v)
-                if cand_low.startswith(v) or v.startswith(cand_low) or cand_compact.startswith(v_compact) or v_compact.startswith(cand_compact):
-                    mt = (row.get('MIMEType') or '').lower()
-                    if mt.startswith('image/') and not best_image:
-                        best_image = row
-                    elif mt.startswith('audio/') and not best_audio:
-                        best_audio = row
-            if best_image and best_audio:
-                return (best_image, best_audio)
-
-    # Pass 3: substring
-    for row in rows_to_check:
-        for cand in cand_forms(row):
-            cand_low = cand.lower()
-            cand_compact = re.sub(r"[._\-]", "", cand_low)
-            for var in phys_variants + shelf_variants:
-                v = var.lower()
-                v_compact = re.sub(r"[._\-]", "", v)
-                if v in cand_low or cand_low in v or v_compact in cand_compact or cand_compact in v_compact:
-                    mt = (row.get('MIMEType') or '').lower()
-                    if mt.startswith('image/') and not best_image:
-                        best_image = row
-                    elif mt.startswith('audio/') and not best_audio:
-                        best_audio = row
-        if best_image and best_audio:
+    if matcher is None:
+        if isinstance(source2_mapping, dict):
+            return _scan_direct_matches(phys_obj_loc, shelf_locator, source2_mapping)
+        matcher = DirectMatcher(source2_mapping)
+    return matcher.find(phys_obj_loc, shelf_locator)
+
+def _scan_direct_matches(phys_obj_loc, shelf_locator, source2_mapping):
+    # The exact, startswith and substring passes as full scans over a dict's rows
+    variants = [(v, _compact(v)) for v in _match_variants(phys_obj_loc, shelf_locator)[0]]
+    passes = [
+        lambda c, cc, v, vc: cc == vc,
+        lambda c, cc, v, vc: c.startswith(v) or v.startswith(c) or cc.startswith(vc) or vc.startswith(cc),
+        lambda c, cc, v, vc: v in c or c in v or vc in cc or cc in vc,
+    ]
+    rows = list({id(v): v for v in source2_mapping.values()}.values())
+    best = [None, None]
+    for matches in passes:
+        for row in rows:
+            mt = (row.get('MIMEType') or '').lower()
+            kind = 0 if mt.startswith('image/') else 1 if mt.startswith('audio/') else None
+            if kind is None or best[kind] is not None:
+                continue
+            for cand in _candidate_stems(row):
+                cand_low = cand.lower()
+                cand_compact = _compact(cand_low)
+                if any(matches(cand_low, cand_compact, v, vc) for v, vc in variants):
+                    best[kind] = row
+                    break
+        if best[0] is not None and best[1] is not None:
             break
+    return tuple(best)
 
-    return (best_image, best_audio)
+class _RelatedStrings:
+    """
+    A set of strings answering whether any of them is a substring of s or contains s,
+    through trigram tables instead of comparing s against every string.
+    """
+    GRAM = 3
+
+    def __init__(self, strings):
+        self.strings = set(strings)
+        self.max_len = max(map(len, self.strings), default=0)
+        # Strings too short to have a trigram, and every substring that short
+        self.short = {v for v in self.strings if len(v) < self.GRAM}
+        self.short_parts = set()
+        # Lengths of the strings starting with each trigram, and the strings containing it
+        self.lengths = {}
+        self.grams = {}
+        for v in self.strings:
+            for i in range(len(v) + 1):
+                for n in range(self.GRAM):
+                    if i + n <= len(v):
+                        self.short_parts.add(v[i:i + n])
+            if len(v) >= self.GRAM:
+                self.lengths.setdefault(v[:self.GRAM], set()).add(len(v))
+            for gram in {v[i:i + self.GRAM] for i in range(len(v) - self.GRAM + 1)}:
+                self.grams.setdefault(gram, []).append(v)
+
+    def related(self, s):
+        # Some string is a substring of s
+        if self.short and any(s[i:i + n] in self.short for n in range(self.GRAM) for i in range(len(s) - n + 1)):
+            return True
+        for i in range(len(s) - self.GRAM + 1):
+            lengths = self.lengths.get(s[i:i + self.GRAM])
+            if lengths and any(s[i:i + n] in self.strings for n in lengths):
+                return True
+        # s is a substring of some string
+        if len(s) > self.max_len:
+            return False
+        if len(s) < self.GRAM:
+            return s in self.short_parts
+        postings = min((self.grams.get(s[i:i + self.GRAM], ()) for i in range(len(s) - self.GRAM + 1)), key=len)
+        return any(s in v for v in postings)
+
+class LocatorPrefilter:
+    """
+    The locators of every source1 row in the forms the matchers compare file names with:
+    compound child prefixes (is_compound), SR/MI dotted numbers (sr_mi_dot_match) and the
+    lowercased and compacted search strings of find_best_direct_matches. wanted(relpath)
+    is False only for a file none of them could match, whatever its MIME type, so leaving
+    such files out of the metadata scan doesn't change product.csv.
+    """
+    def __init__(self, source1_rows):
+        prefixes = set()
+        dotted = set()
+        variants = set()
+        compacts = set()
+        for idx, row in enumerate(source1_rows):
+            prefixes.update(compound_prefixes(row))
+            f = source1_fields(row, idx, "")
+            dotted_loc = sr_mi_dotted_locator(f["phys_obj_loc"])
+            if dotted_loc:
+                dotted.add(dotted_loc)
+            row_variants, row_compacts = _match_variants(f["phys_obj_loc"], f["shelf_locator"])
+            variants.update(row_variants)
+            compacts.update(row_compacts)
+        self.prefixes = prefixes
+        self.prefix_lengths = sorted({len(p) for p in prefixes})
+        self.dotted = dotted
+        self.dotted_lengths = sorted({len(d) for d in dotted})
+        self.low = _RelatedStrings(variants)
+        self.compact = _RelatedStrings(compacts)
+
+    def wanted(self, relpath):
+        # relpath is a SourceFile; its keys in Source2Store are it, its FileName and their
+        # dot-mapped forms (uncached regexes: file names are mostly unique)
+        name = os.path.basename(relpath)
+        dot_name = _DIGIT_UNDERSCORE_RE.sub('.', name)
+        for stem in {_compound_stem(name), _compound_stem(dot_name)}:
+            if any(stem[:n] in self.prefixes for n in self.prefix_lengths):
+                return True
+        for base in {_dot_base(relpath), _dot_base(name)}:
+            if any(base[:n] in self.dotted and not "0" <= base[n:n + 1] <= "9" for n in self.dotted_lengths):
+                return True
+        stem = os.path.splitext(name)[0].lower()
+        return self.low.related(stem) or self.compact.related(_SEPARATORS_RE.sub("", stem))
+
+# Persisted match index: source2 rows, keys and the lookup tables of CompoundIndex,
+# DotBaseIndex and DirectMatcher in one SQLite file, reusable by later runs
+SOURCE2_INDEX_NAME = "source2_index.sqlite"
+SOURCE2_INDEX_VERSION = "1"
+# Lookups kept per open index; the same locators are asked for by both passes
+INDEX_QUERY_CACHE_SIZE = 65536
+INDEX_MMAP_SIZE = 1 << 30
+# Stay below SQLite's older limit of 999 parameters per statement
+SQL_MAX_PARAMS = 900
+
+def file_digest(path):
+    import hashlib
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _sql_prefix(column, prefix):
+    # WHERE clause (and parameters) for the values of column that start with prefix,
+    # written as a range so SQLite can use the column's index
+    if not prefix:
+        return "1", ()
+    last = ord(prefix[-1])
+    if last < 0x10FFFF:
+        upper = last + 1 if last != 0xD7FF else 0xE000  # surrogates can't be stored
+        return f"{column} >= ? AND {column} < ?", (prefix, prefix[:-1] + chr(upper))
+    return f"substr({column}, 1, ?) = ?", (len(prefix), prefix)
+
+def build_source2_index(source2_path, index_path, dot_variants=True):
+    """
+    Write the SQLite match index for source2_path to index_path. The file is built under a
+    temporary name and moved into place, so readers never see a half-written index.
+    """
+    store = load_source2(source2_path, dot_variants)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        with conn:
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE records (id INTEGER PRIMARY KEY, vals TEXT)")
+            conn.execute("CREATE TABLE keys (key TEXT PRIMARY KEY, pos INTEGER, record_id INTEGER) WITHOUT ROWID")
+            conn.executemany("INSERT INTO records (id, vals) VALUES (?, ?)",
+                             ((i, json.dumps(record._values)) for i, record in enumerate(store.records)))
+            conn.executemany("INSERT INTO keys (key, pos, record_id) VALUES (?, ?, ?)",
+                             ((key, pos, idx) for pos, (key, idx) in enumerate(store.key_index.items())))
+            fts = False
+            # Maps mode (no dot variants) only looks files up by name
+            if dot_variants:
+                conn.execute("CREATE TABLE stems (stem TEXT, pos INTEGER, record_id INTEGER, PRIMARY KEY (stem, pos)) WITHOUT ROWID")
+                conn.executemany("INSERT INTO stems (stem, pos, record_id) VALUES (?, ?, ?)",
+                                 ((_compound_stem(key), pos, idx) for pos, (key, idx) in enumerate(store.key_index.items())))
+                conn.execute("CREATE TABLE dot_bases (base TEXT, pos INTEGER, record_id INTEGER, PRIMARY KEY (base, pos)) WITHOUT ROWID")
+                conn.executemany("INSERT INTO dot_bases (base, pos, record_id) VALUES (?, ?, ?)",
+                                 ((_dot_base(key), pos, idx) for pos, (key, idx) in enumerate(store.key_index.items())))
+                conn.execute("CREATE TABLE match_keys (id INTEGER PRIMARY KEY, form INTEGER, key TEXT, image_pos INTEGER, audio_pos INTEGER)")
+                conn.execute("CREATE UNIQUE INDEX match_keys_form_key ON match_keys (form, key)")
+                for form, first_pos in enumerate(_match_key_positions(store.records)):
+                    conn.executemany(
+                        "INSERT INTO match_keys (form, key, image_pos, audio_pos) VALUES (?, ?, ?, ?)",
+                        ((form, key, *(None if pos == _NO_MATCH else pos for pos in hit)) for key, hit in first_pos.items()))
+                # Trigram full-text index for substring lookups, where this SQLite has one
+                try:
+                    conn.execute("CREATE VIRTUAL TABLE match_fts USING fts5(key, content='match_keys', content_rowid='id', tokenize='trigram', columnsize=0)")
+                    conn.execute("INSERT INTO match_fts (rowid, key) SELECT id, key FROM match_keys")
+                    fts = True
+                except sqlite3.OperationalError:
+                    pass
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                ("version", SOURCE2_INDEX_VERSION), ("digest", file_digest(source2_path)),
+                ("dot_variants", "1" if dot_variants else "0"), ("fts", "1" if fts else "0"),
+                ("columns", json.dumps(sorted(store.columns, key=store.columns.get))),
+            ])
+    finally:
+        conn.close()
+    os.replace(tmp_path, index_path)
+
+def load_source2_index(source2_path, index_path=None, dot_variants=True):
+    """
+    Source2Index for source2_path, reusing index_path (default: source2_index.sqlite next
+    to source2.csv) when it was built from a source2.csv with the same contents, and
+    (re)building it otherwise. Several exports scanned from one media folder can share
+    one index file.
+    """
+    if index_path is None:
+        index_path = os.path.join(os.path.dirname(os.path.abspath(source2_path)), SOURCE2_INDEX_NAME)
+    wanted = {"version": SOURCE2_INDEX_VERSION, "digest": file_digest(source2_path),
+              "dot_variants": "1" if dot_variants else "0"}
+    if os.path.exists(index_path):
+        try:
+            index = Source2Index(index_path)
+            if all(index.meta.get(k) == v for k, v in wanted.items()):
+                print(f"Using the source2 index {index_path}")
+                return index
+            index.close()
+        except sqlite3.DatabaseError:
+            pass
+    print(f"Building the source2 index {index_path}")
+    build_source2_index(source2_path, index_path, dot_variants)
+    return Source2Index(index_path)
+
+class Source2Index:
+    """
+    A source2 match index file (see build_source2_index), read through the same calls as
+    Source2Store: the mapping API, records, column_by_key and the compound_index,
+    dot_index and match_keys lookups of the matchers. Nothing is loaded up front; each
+    lookup is a query on the indexed tables, and recent answers are cached. Pickling keeps
+    only the path, so worker processes open the same file and share its pages through
+    the OS cache instead of each holding a copy of source2.
+    """
+    def __init__(self, index_path):
+        self.path = index_path
+        self._open()
+
+    def _open(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        # Read the file through a memory map, so processes using one index share its pages
+        self.conn.execute(f"PRAGMA mmap_size = {INDEX_MMAP_SIZE}")
+        self.meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+        self.columns = {name: i for i, name in enumerate(json.loads(self.meta["columns"]))}
+        self.records = _IndexedRecords(self)
+        self.query = lru_cache(maxsize=INDEX_QUERY_CACHE_SIZE)(self._query)
 
-def source1_to_product(source1_path, source2_mapping, output_path, member_of_existing_entity_id, error_path):
-    import csv, re
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self._open()
+
+    def close(self):
+        self.conn.close()
+
+    def _query(self, sql, params=()):
+        # All rows of a read-only query, as a tuple so the cached answer can be shared
+        return tuple(self.conn.execute(sql, params))
+
+    def record(self, record_id):
+        vals = self.query("SELECT vals FROM records WHERE id = ?", (record_id,))[0][0]
+        return Source2Record(self.columns, tuple(json.loads(vals)))
+
+    def _record_id(self, key):
+        found = self.query("SELECT record_id FROM keys WHERE key = ?", (key,))
+        return found[0][0] if found else None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM keys").fetchone()[0]
+
+    def __iter__(self):
+        return (key for key, in self.conn.execute("SELECT key FROM keys ORDER BY pos"))
+
+    def __contains__(self, key):
+        return self._record_id(key) is not None
+
+    def __getitem__(self, key):
+        record_id = self._record_id(key)
+        if record_id is None:
+            raise KeyError(key)
+        return self.record(record_id)
+
+    def get(self, key, default=None):
+        record_id = self._record_id(key)
+        return default if record_id is None else self.record(record_id)
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for key, record_id in self.conn.execute("SELECT key, record_id FROM keys ORDER BY pos"):
+            yield key, self.record(record_id)
+
+    def values(self):
+        for record_id, in self.conn.execute("SELECT record_id FROM keys ORDER BY pos"):
+            yield self.record(record_id)
+
+    def column_by_key(self, field):
+        return _IndexedColumn(self, self.columns.get(field))
+
+    def compound_index(self):
+        return _IndexedCompoundIndex(self)
+
+    def dot_index(self):
+        return _IndexedDotBaseIndex(self)
+
+    def match_keys(self):
+        return _IndexedMatchKeys(self, 0), _IndexedMatchKeys(self, 1)
+
+class _IndexedRecords:
+    # Source2Index.records: records by position, fetched when asked for
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return self.index.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def __getitem__(self, record_id):
+        return self.index.record(record_id)
+
+class _IndexedColumn:
+    # Source2Index.column_by_key: {key: value of one column}, looked up key by key
+    def __init__(self, index, col):
+        self.index = index
+        self.col = col
+
+    def get(self, key, default=None):
+        record_id = self.index._record_id(key)
+        if record_id is None:
+            return default
+        return None if self.col is None else self.index.record(record_id)._values[self.col]
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return self.get(key)
+
+    def __contains__(self, key):
+        return key in self.index
+
+class _IndexedCompoundIndex:
+    # CompoundIndex.children, answered from the stems table
+    def __init__(self, index):
+        self.index = index
+
+    def children(self, prefixes):
+        hits = {}
+        for prefix in prefixes:
+            where, params = _sql_prefix("stem", prefix)
+            for pos, record_id in self.index.query(f"SELECT pos, record_id FROM stems WHERE {where}", params):
+                hits[pos] = record_id
+        children = []
+        seen = set()
+        for pos in sorted(hits):
+            record_id = hits[pos]
+            if record_id not in seen:
+                seen.add(record_id)
+                children.append(self.index.record(record_id))
+        return children
+
+class _IndexedDotBaseIndex:
+    # DotBaseIndex.first_with_prefix, answered from the dot_bases table
+    def __init__(self, index):
+        self.index = index
+
+    def first_with_prefix(self, prefix):
+        where, params = _sql_prefix("base", prefix)
+        found = self.index.query(f"SELECT record_id FROM dot_bases WHERE {where} "
+                                 "AND substr(base, ?, 1) NOT BETWEEN '0' AND '9' ORDER BY pos LIMIT 1",
+                                 params + (len(prefix) + 1,))
+        return self.index.record(found[0][0]) if found else None
+
+class _IndexedMatchKeys:
+    """
+    _MatchKeys of one form (0 lowercase, 1 compact) answered from the match_keys table.
+    Each lookup fetches the image and the audio position together, since find asks for
+    both kinds in turn.
+    """
+    def __init__(self, index, form):
+        self.index = index
+        self.form = form
+        self.has_fts = index.meta.get("fts") == "1"
+
+    def _first(self, where, params):
+        found = self.index.query(
+            f"SELECT MIN(image_pos), MIN(audio_pos) FROM match_keys WHERE form = ? AND {where}",
+            (self.form,) + tuple(params))
+        return tuple(_NO_MATCH if pos is None else pos for pos in found[0])
+
+    def _first_of_keys(self, keys):
+        best = [_NO_MATCH, _NO_MATCH]
+        keys = sorted(set(keys))
+        for start in range(0, len(keys), SQL_MAX_PARAMS):
+            chunk = tuple(keys[start:start + SQL_MAX_PARAMS])
+            hit = self._first(f"key IN ({', '.join('?' * len(chunk))})", chunk)
+            best = [min(best[0], hit[0]), min(best[1], hit[1])]
+        return best
+
+    def exact(self, s, kind):
+        return self._first("key = ?", (s,))[kind]
+
+    def with_prefix(self, prefix, kind):
+        return self._first(*_sql_prefix("key", prefix))[kind]
+
+    def prefix_of(self, s, kind):
+        return self._first_of_keys(s[:i] for i in range(len(s) + 1))[kind]
+
+    def containing(self, s, kind):
+        if not s:
+            return self._first("1", ())[kind]
+        if self.has_fts and len(s) >= _MatchKeys.GRAM:
+            # The trigram index finds the candidates (CROSS JOIN keeps SQLite from scanning
+            # match_keys instead); instr keeps the test exact
+            phrase = '"' + s.replace('"', '""') + '"'
+            found = self.index.query(
+                "SELECT MIN(m.image_pos), MIN(m.audio_pos) FROM match_fts CROSS JOIN match_keys m ON m.id = match_fts.rowid "
+                "WHERE match_fts MATCH ? AND m.form = ? AND instr(m.key, ?) > 0", (phrase, self.form, s))
+            pos = found[0][kind]
+            return _NO_MATCH if pos is None else pos
+        return self._first("instr(key, ?) > 0", (s,))[kind]
+
+    def contained_in(self, s, kind):
+        return self._first_of_keys(s[i:j] for i in range(len(s) + 1) for j in range(i, len(s) + 1))[kind]
+
+def iter_source1_rows(source1_path):
+    # Yield source1 rows one at a time so large AtoM exports are never held in memory
+    # (source1_path may be the clipboard zip itself)
+    with open_source1(source1_path) as f1:
+        for row in csv.DictReader(f1):
+            yield row
+
+def source1_row_id(row, idx):
+    return row.get('legacyId', '').strip() or row.get('ID', '').strip() or str(idx + 1)
+
+def source1_fields(row, idx, uniform_authorized_name):
+    """Product fields of one source1 row that both passes of source1_to_product use."""
+    event_actors = (row.get('eventActors') or '').strip()
+    other_persons = (
+        row.get('radTitleStatementOfResponsibility', '') or
+        row.get('radTitleStatementOfResponsibilityNote', '') or
+        row.get('radTitleAttributionsAndConjectures', '') or
+        row.get('radNoteAccompanyingMaterial', '') or
+        ''
+    ).strip()
+
+    field_val = ""
+    if event_actors and other_persons:
+        field_val = f"{event_actors}; {other_persons}"
+    else:
+        field_val = event_actors or other_persons
+    if not field_val or field_val.upper() == "NULL":
+        field_val = uniform_authorized_name if uniform_authorized_name else field_val
+
+    event_start = row.get('eventStartDates', '').strip()
+    event_end = row.get('eventEndDates', '').strip()
+    if event_start and event_end:
+        if event_start == event_end:
+            origin_information = event_start
+        else:
+            origin_information = f"{event_start}/{event_end}" if event_end else event_start
+    elif event_start:
+        origin_information = event_start
+    elif event_end:
+        origin_information = event_end
+    else:
+        origin_information = ""
+
+    slug = row.get('slug', '').strip()
+    return {
+        "source1_id": source1_row_id(row, idx),
+        "phys_obj_loc": (row.get('physicalObjectLocation') or '').strip(),
+        "shelf_locator": (row.get('physicalObjectLocation') or row.get('shelf_locator') or row.get('shelfLocator') or '').strip(),
+        "title": (row.get('title') or '').strip(),
+        "language": 'English',
+        "local_identifier": row.get('referenceCode', ''),
+        "field_val": field_val,
+        "description": row.get('scopeAndContent', ''),
+        "origin_information": origin_information,
+        "extent": reformat_extent_and_medium(row.get('extentAndMedium', '')),
+        "physical_location": row.get('repository', ''),
+        "location_url": f"https://db-archives.library.queensu.ca/{slug}" if slug else "",
+    }
+
+class Source1Transformer:
+    """
+    The per-row work of source1_to_product against read-only source2 indexes: field
+    mapping, compound detection and direct matching. Compound child rows come back with
+    ID None so the caller can number them in input order, whichever process did the work.
+    """
+    def __init__(self, source2_mapping, member_of_existing_entity_id, uniform_authorized_name):
+        self.source2_mapping = source2_mapping
+        self.member_of_existing_entity_id = member_of_existing_entity_id
+        self.uniform_authorized_name = uniform_authorized_name
+        self.compound_index = source2_mapping.compound_index()
+        self.matcher = DirectMatcher(source2_mapping)
+        self.dot_index = source2_mapping.dot_index()
+
+    def compound_rows(self, item):
+        # Pass 1: (source1_id, compound parent and child rows, or [] if the row is not compound)
+        idx, row = item
+        f = source1_fields(row, idx, self.uniform_authorized_name)
+        source1_id = f["source1_id"]
+        title = f["title"]
+        shelf_locator = f["shelf_locator"]
+        phys_obj_loc = f["phys_obj_loc"]
+        location_url = f["location_url"]
+        image_children, audio_children = is_compound(row, self.source2_mapping, self.compound_index)
+        rows = []
+
+        if audio_children:
+            compound_title = f"{title} - {shelf_locator}" if shelf_locator else title
+            rows.append([
+                source1_id, self.member_of_existing_entity_id, '', 'Compound', '', '', compound_title, 'Sound',
+                f["language"], f["local_identifier"], f["field_val"], f["description"], f["origin_information"], f["extent"],
+                f["physical_location"], shelf_locator, location_url
+            ])
+            norm_shelf_locator = normalize_audio_shelf(shelf_locator)
+            for m in audio_children:
+                side_label = extract_side_label(m.get('SourceFile') or m.get('FileName',''), norm_shelf_locator)
+                child_title = f"{title} - {shelf_locator}-{side_label}" if side_label else f"{title} - {shelf_locator}"
+                rows.append([
+                    None, '', source1_id, 'Audio',
+                    f"repo-ingest://archives/{m.get('FileName', m.get('SourceFile',''))}", m.get('MIMEType', ''),
+                    child_title, 'Sound', '', '', '', '', '', '', '', '', location_url
+                ])
+
+        if image_children:
+            compound_title = f"{title} - {phys_obj_loc}" if phys_obj_loc else title
+            rows.append([
+                source1_id, self.member_of_existing_entity_id, '', 'Compound', '', '', compound_title, 'Image',
+                f["language"], f["local_identifier"], f["field_val"], f["description"], f["origin_information"], f["extent"],
+                f["physical_location"], phys_obj_loc, location_url
+            ])
+            for m in image_children:
+                child_title = f"{title} - {os.path.splitext(m.get('SourceFile',''))[0]}" if m.get('SourceFile') else f"{title}"
+                rows.append([
+                    None, '', source1_id, 'Image', f"repo-ingest://archives/{m.get('FileName', m.get('SourceFile',''))}", m.get('MIMEType', ''),
+                    child_title, 'Image', '', '', '', '', '', '', '', '', location_url
+                ])
+        return source1_id, rows
+
+    def direct_row(self, item):
+        # Pass 2: (idx, product row, run report counters) for a row that is not compound
+        idx, row = item
+        f = source1_fields(row, idx, self.uniform_authorized_name)
+        source1_id = f["source1_id"]
+        title = f["title"]
+        shelf_locator = f["shelf_locator"]
+        phys_obj_loc = f["phys_obj_loc"]
+        counts = {}
+
+        # Try to find direct image/audio matches using broadened matching
+        hits_before = dict(self.matcher.hits)
+        direct_image, direct_audio = find_best_direct_matches(phys_obj_loc, shelf_locator, self.source2_mapping, self.matcher)
+        for pass_name, hits in self.matcher.hits.items():
+            if hits != hits_before[pass_name]:
+                counts[f"direct_match_{pass_name}_hits"] = hits - hits_before[pass_name]
+        if not direct_image and not direct_audio:
+            # SR/MI reel numbers followed by other text ("SR 1267.435 box 2") can still
+            # be found by their dotted number
+            sr_mi_row = sr_mi_dot_match(phys_obj_loc, self.source2_mapping, self.dot_index)
+            mt = ((sr_mi_row and sr_mi_row.get('MIMEType')) or '').lower()
+            if mt.startswith('audio/'):
+                direct_audio = sr_mi_row
+            elif mt.startswith('image/'):
+                direct_image = sr_mi_row
+            if direct_audio or direct_image:
+                counts["sr_mi_dot_hits"] = 1
+
+        if direct_audio:
+            norm_shelf_locator = normalize_audio_shelf(shelf_locator)
+            side_label = extract_side_label(direct_audio.get('SourceFile') or direct_audio.get('FileName',''), norm_shelf_locator)
+            item_title = f"{title} - {shelf_locator}-{side_label}" if side_label else f"{title} - {shelf_locator}" if shelf_locator else title
+            return idx, [
+                source1_id, self.member_of_existing_entity_id, '', 'Audio',
+                f"repo-ingest://archives/{direct_audio.get('FileName', direct_audio.get('SourceFile',''))}", direct_audio.get('MIMEType',''),
+                item_title, 'Sound', f["language"], f["local_identifier"], f["field_val"], f["description"], f["origin_information"], f["extent"],
+                f["physical_location"], shelf_locator, f["location_url"]
+            ], counts
+
+        if direct_image:
+            sf_base = direct_image.get('SourceFile', '')
+            sf_base_title = os.path.splitext(os.path.basename(sf_base))[0] if sf_base else ""
+            item_title = f"{title} - {sf_base_title}" if sf_base_title else title
+            return idx, [
+                source1_id, self.member_of_existing_entity_id, '', 'Image',
+                f"repo-ingest://archives/{direct_image.get('FileName', direct_image.get('SourceFile',''))}", direct_image.get('MIMEType',''),
+                item_title, 'Image', f["language"], f["local_identifier"], f["field_val"], f["description"], f["origin_information"], f["extent"],
+                f["physical_location"], phys_obj_loc, f["location_url"]
+            ], counts
+
+        # No direct match: write a normal row without digital_file
+        counts["unmatched_rows"] = 1
+        return idx, [
+            source1_id, self.member_of_existing_entity_id, '', 'Image',
+            '', '', title, 'Image', f["language"], f["local_identifier"], f["field_val"], f["description"], f["origin_information"], f["extent"],
+            f["physical_location"], phys_obj_loc, f["location_url"]
+        ], counts
+
+# Each process of a parallel source1_to_product run builds its own transformer once
+_worker_transformer = None
+
+def _init_source1_worker(source2_mapping, member_of_existing_entity_id, uniform_authorized_name):
+    global _worker_transformer
+    _worker_transformer = Source1Transformer(source2_mapping, member_of_existing_entity_id, uniform_authorized_name)
+
+def _worker_compound_rows(item):
+    return _worker_transformer.compound_rows(item)
+
+def _worker_direct_row(item):
+    return _worker_transformer.direct_row(item)
+
+SOURCE1_CHUNK_SIZE = 64
+
+@contextlib.contextmanager
+def source1_transforms(source2_mapping, member_of_existing_entity_id, uniform_authorized_name, workers=1):
+    """
+    Yields (compound, direct) functions mapping an iterable of (idx, row) pairs to
+    Source1Transformer results in input order, run in `workers` processes when above 1.
+    """
+    if workers > 1:
+        import multiprocessing
+        # imap keeps results in input order while reading source1 lazily
+        pool = multiprocessing.Pool(workers, _init_source1_worker,
+                                    (source2_mapping, member_of_existing_entity_id, uniform_authorized_name))
+        try:
+            yield (lambda items: pool.imap(_worker_compound_rows, items, SOURCE1_CHUNK_SIZE),
+                   lambda items: pool.imap(_worker_direct_row, items, SOURCE1_CHUNK_SIZE))
+        finally:
+            # Every result has been read by now (or an error is on its way), so stop the workers
+            pool.terminate()
+            pool.join()
+    else:
+        transformer = Source1Transformer(source2_mapping, member_of_existing_entity_id, uniform_authorized_name)
+        yield (lambda items: map(transformer.compound_rows, items),
+               lambda items: map(transformer.direct_row, items))
 
+def ask_name_answers(is_corporate=None, uniform_authorized_name=None):
+    """Ask for whichever of is_corporate and uniform_authorized_name is None; returns both."""
     # Prompt for entity type
-    is_corporate = False
-    print("Are these records from a Corporation or Conceptual entity? (y/n)")
-    answer = input().strip().lower()
-    if answer == "y":
-        is_corporate = True
+    if is_corporate is None:
+        is_corporate = False
+        print("Are these records from a Corporation or Conceptual entity? (y/n)")
+        answer = input().strip().lower()
+        if answer == "y":
+            is_corporate = True
 
     # Ask if Authorized form of name is the same for all records
-    print(f"Is the Authorized form of name for {('organizations' if is_corporate else 'persons')} the same for all records? (y/n)")
-    uniform_name_answer = input().strip().lower()
-    uniform_authorized_name = ""
-    if uniform_name_answer == "y":
-        print(f"Please enter the Authorized form of name for all records ({'organizations' if is_corporate else 'persons'}):")
-        uniform_authorized_name = input().strip()
+    if uniform_authorized_name is None:
+        print(f"Is the Authorized form of name for {('organizations' if is_corporate else 'persons')} the same for all records? (y/n)")
+        uniform_name_answer = input().strip().lower()
+        uniform_authorized_name = ""
+        if uniform_name_answer == "y":
+            print(f"Please enter the Authorized form of name for all records ({'organizations' if is_corporate else 'persons'}):")
+            uniform_authorized_name = input().strip()
+    return is_corporate, uniform_authorized_name
+
+def source1_to_product(source1_path, source2_mapping, output_path, member_of_existing_entity_id, error_path,
+                       is_corporate=None, uniform_authorized_name=None, report=None, workers=1, checkpoint=None):
+    """
+    is_corporate and uniform_authorized_name are asked for interactively when left as None;
+    pass False/"" (or True/a name) to run without prompts. A RunReport passed as report
+    receives timings for index building and both passes, and match counters.
+    workers > 1 transforms source1 rows in that many processes; results are written in
+    input order and child IDs are numbered here, so the output is the same as a serial run.
+    Unmatched rows and rows with blank required fields are collected as they are written
+    and reported in error_path and in a CSV of the same name next to it.
+
+    With a RunCheckpoint, the answers and progress are saved every CHECKPOINT_EVERY_ROWS
+    source1 rows. If the checkpoint already holds progress, product.csv is cut back to the
+    last checkpoint and the run continues from there, with the same child IDs and reports
+    as an uninterrupted run.
+    """
+    import csv, re
+
+    if checkpoint:
+        answers = checkpoint.get("answers", {})
+        if is_corporate is None:
+            is_corporate = answers.get("is_corporate")
+        if uniform_authorized_name is None:
+            uniform_authorized_name = answers.get("uniform_authorized_name")
+
+    is_corporate, uniform_authorized_name = ask_name_answers(is_corporate, uniform_authorized_name)
+
+    if checkpoint:
+        checkpoint.save(answers=dict(checkpoint.get("answers", {}), is_corporate=is_corporate,
+                                     uniform_authorized_name=uniform_authorized_name))
 
     header = [
         'ID', 'member_of_existing_entity_id', 'member_of', 'model', 'digital_file', 'mime', 'title', 'resource_type',
@@ -315,6 +2294,35 @@ def source1_to_product(source1_path, source2_mapping, output_path, member_of_exi
     collections_by_id = set()
     written_ids = set()
     next_compound_child_id = 1
+    product_rownum = 1  # header
+    counts = {f"direct_match_{pass_name}_hits": 0 for pass_name in ("exact", "prefix", "substring")}
+
+    # Where to pick up: pass 1 or 2, and the first source1 row of that pass still to do
+    progress = checkpoint.get("product") if checkpoint else None
+    journal = checkpoint.read_journal(progress["journal_offset"] if progress else 0) if checkpoint else None
+    if progress and not (os.path.exists(output_path) and os.path.getsize(output_path) >= progress["offset"]
+                         and journal is not None):
+        print(f"{output_path} or {checkpoint.journal_path} is missing or shorter than the checkpoint; "
+              "writing product.csv from the start")
+        progress = None
+        checkpoint.read_journal(0)
+    if progress:
+        for kind, value in journal:
+            if kind == "written":
+                written_ids.add(value)
+            else:
+                (error_rows if kind == "error" else blank_rows).append(value)
+        next_compound_child_id = progress["next_child_id"]
+        product_rownum = progress["product_rownum"]
+        counts = progress["counts"]
+        resume_pass, resume_idx = progress["pass"], progress["next_idx"]
+        print(f"Resuming product.csv at pass {resume_pass}, source1 row {resume_idx + 2}")
+        with open(output_path, 'r+b') as pf:
+            pf.truncate(progress["offset"])
+        if report:
+            report.count("resumed_at_source1_row", resume_idx + 2)
+    else:
+        resume_pass, resume_idx = 1, 0
 
     def get_next_child_id():
         nonlocal next_compound_child_id
@@ -322,184 +2330,162 @@ def source1_to_product(source1_path, source2_mapping, output_path, member_of_exi
         next_compound_child_id += 1
         return str(v)
 
-    with open(source1_path, newline='', encoding='utf-8') as f1:
-        reader = csv.DictReader(f1)
-        source1_rows = list(reader)
-
-    with open(output_path, 'w', newline='', encoding='utf-8') as outf:
+    def check_written(product_row, source_row):
+        nonlocal product_rownum
+        product_rownum += 1
+        missing = missing_required_fields(header, product_row)
+        if missing:
+            blank_rows.append({'rownum': product_rownum, 'source_row': source_row,
+                               'fields': missing, 'values': product_row})
+
+    # Written IDs and error/blank rows not yet in the checkpoint journal
+    unsaved_ids = []
+    saved_errors, saved_blanks = len(error_rows), len(blank_rows)
+
+    def save_progress(pass_num, next_idx):
+        nonlocal saved_errors, saved_blanks
+        if not checkpoint:
+            return
+        outf.flush()
+        journal_offset = checkpoint.append_journal(
+            [["written", i] for i in unsaved_ids] + [["error", row] for row in error_rows[saved_errors:]]
+            + [["blank", row] for row in blank_rows[saved_blanks:]])
+        unsaved_ids.clear()
+        saved_errors, saved_blanks = len(error_rows), len(blank_rows)
+        checkpoint.save(product={
+            "pass": pass_num, "next_idx": next_idx, "offset": outf.tell(), "journal_offset": journal_offset,
+            "next_child_id": next_compound_child_id, "product_rownum": product_rownum, "counts": counts,
+        })
+
+    if report:
+        stage = report.start("build_indexes")
+    with source1_transforms(source2_mapping, member_of_existing_entity_id, uniform_authorized_name, workers) as transforms, \
+         open(output_path, 'a' if progress else 'w', newline='', encoding='utf-8') as outf:
+        transform_compound, transform_direct = transforms
+        if report:
+            report.finish(stage, rows=len(source2_mapping.records))
         writer = csv.writer(outf)
-        writer.writerow(header)
+        if not progress:
+            writer.writerow(header)
 
         # Pass 1: Write compound parents and their children
-        for idx, row in enumerate(source1_rows):
-            source1_id = row.get('legacyId', '').strip() or row.get('ID', '').strip() or str(idx + 1)
-            phys_obj_loc = (row.get('physicalObjectLocation') or '').strip()
-            shelf_locator = (row.get('physicalObjectLocation') or row.get('shelf_locator') or row.get('shelfLocator') or '').strip()
-            title = (row.get('title') or '').strip()
-            language = 'English'
-            local_identifier = row.get('referenceCode', '')
-            event_actors = (row.get('eventActors') or '').strip()
-            other_persons = (
-                row.get('radTitleStatementOfResponsibility', '') or
-                row.get('radTitleStatementOfResponsibilityNote', '') or
-                row.get('radTitleAttributionsAndConjectures', '') or
-                row.get('radNoteAccompanyingMaterial', '') or
-                ''
-            ).strip()
-
-            field_val = ""
-            if event_actors and other_persons:
-                field_val = f"{event_actors}; {other_persons}"
-            else:
-                field_val = event_actors or other_persons
-            if not field_val or field_val.upper() == "NULL":
-                field_val = uniform_authorized_name if uniform_authorized_name else field_val
-
-            description = row.get('scopeAndContent', '')
-            event_start = row.get('eventStartDates', '').strip()
-            event_end = row.get('eventEndDates', '').strip()
-            if event_start and event_end:
-                if event_start == event_end:
-                    origin_information = event_start
-                else:
-                    origin_information = f"{event_start}/{event_end}" if event_end else event_start
-            elif event_start:
-                origin_information = event_start
-            elif event_end:
-                origin_information = event_end
-            else:
-                origin_information = ""
-
-            extent = reformat_extent_and_medium(row.get('extentAndMedium', ''))
-            physical_location = row.get('repository', '')
-            slug = row.get('slug', '').strip()
-            location_url = f"https://db-archives.library.queensu.ca/{slug}" if slug else ""
-
-            image_children, audio_children = is_compound(row, source2_mapping)
-
-            if audio_children:
-                written_ids.add(source1_id)
-                compound_title = f"{title} - {shelf_locator}" if shelf_locator else title
-                compound_row = [
-                    source1_id, member_of_existing_entity_id, '', 'Compound', '', '', compound_title, 'Sound',
-                    language, local_identifier, field_val, description, origin_information, extent, physical_location, shelf_locator, location_url
-                ]
-                writer.writerow(compound_row)
-                for m in audio_children:
-                    child_id = get_next_child_id()
-                    norm_shelf_locator = normalize_audio_shelf(shelf_locator)
-                    side_label = extract_side_label(m.get('SourceFile') or m.get('FileName',''), norm_shelf_locator)
-                    child_title = f"{title} - {shelf_locator}-{side_label}" if side_label else f"{title} - {shelf_locator}"
-                    child_row = [
-                        child_id, '', source1_id, 'Audio',
-                        f"repo-ingest://archives/{m.get('FileName', m.get('SourceFile',''))}", m.get('MIMEType', ''),
-                        child_title, 'Sound', '', '', '', '', '', '', '', '', location_url
-                    ]
-                    writer.writerow(child_row)
-
-            if image_children:
-                written_ids.add(source1_id)
-                compound_title = f"{title} - {phys_obj_loc}" if phys_obj_loc else title
-                compound_row = [
-                    source1_id, member_of_existing_entity_id, '', 'Compound', '', '', compound_title, 'Image',
-                    language, local_identifier, field_val, description, origin_information, extent, physical_location, phys_obj_loc, location_url
-                ]
-                writer.writerow(compound_row)
-                for m in image_children:
-                    child_id = get_next_child_id()
-                    child_title = f"{title} - {os.path.splitext(m.get('SourceFile',''))[0]}" if m.get('SourceFile') else f"{title}"
-                    child_row = [
-                        child_id, '', source1_id, 'Image', f"repo-ingest://archives/{m.get('FileName', m.get('SourceFile',''))}", m.get('MIMEType', ''),
-                        child_title, 'Image', '', '', '', '', '', '', '', '', location_url
-                    ]
-                    writer.writerow(child_row)
+        if report:
+            stage = report.start("compound_detection")
+        source1_count = 0
+        if resume_pass == 1:
+            source1_count = resume_idx
+            pending = ((idx, row) for idx, row in enumerate(iter_source1_rows(source1_path)) if idx >= resume_idx)
+            for source1_id, rows in transform_compound(pending):
+                source1_count += 1
+                if rows:
+                    written_ids.add(source1_id)
+                    unsaved_ids.append(source1_id)
+                    for product_row in rows:
+                        if product_row[0] is None:
+                            product_row[0] = get_next_child_id()
+                        # source1 rows are numbered as in a spreadsheet, with the header as row 1
+                        check_written(product_row, source1_count + 1)
+                    writer.writerows(rows)
+                if source1_count % CHECKPOINT_EVERY_ROWS == 0:
+                    save_progress(1, source1_count)
+            save_progress(2, 0)
+
+        if report:
+            report.finish(stage, rows=source1_count)
+            report.count("compound_parents", len(written_ids))
+            stage = report.start("direct_matching")
 
         # Pass 2: write remaining individual items (non-compound)
-        for idx, row in enumerate(source1_rows):
-            source1_id = row.get('legacyId', '').strip() or row.get('ID', '').strip() or str(idx + 1)
-            if source1_id in written_ids:
-                continue
-            phys_obj_loc = (row.get('physicalObjectLocation') or '').strip()
-            shelf_locator = (row.get('physicalObjectLocation') or row.get('shelf_locator') or row.get('shelfLocator') or '').strip()
-            title = (row.get('title') or '').strip()
-            language = 'English'
-            local_identifier = row.get('referenceCode', '')
-            event_actors = (row.get('eventActors') or '').strip()
-            other_persons = (
-                row.get('radTitleStatementOfResponsibility', '') or
-                row.get('radTitleStatementOfResponsibilityNote', '') or
-                row.get('radTitleAttributionsAndConjectures', '') or
-                row.get('radNoteAccompanyingMaterial', '') or
-                ''
-            ).strip()
-
-            field_val = ""
-            if event_actors and other_persons:
-                field_val = f"{event_actors}; {other_persons}"
-            else:
-                field_val = event_actors or other_persons
-            if not field_val or field_val.upper() == "NULL":
-                field_val = uniform_authorized_name if uniform_authorized_name else field_val
-
-            description = row.get('scopeAndContent', '')
-            event_start = row.get('eventStartDates', '').strip()
-            event_end = row.get('eventEndDates', '').strip()
-            if event_start and event_end:
-                if event_start == event_end:
-                    origin_information = event_start
-                else:
-                    origin_information = f"{event_start}/{event_end}" if event_end else event_start
-            elif event_start:
-                origin_information = event_start
-            elif event_end:
-                origin_information = event_end
+        # (source1 is read again rather than held in memory; only written_ids carries over)
+        pass2_start = resume_idx if resume_pass == 2 else 0
+        remaining = ((idx, row) for idx, row in enumerate(iter_source1_rows(source1_path))
+                     if idx >= pass2_start and source1_row_id(row, idx) not in written_ids)
+        last_saved = pass2_start
+        direct_count = 0
+        for idx, product_row, row_counts in transform_direct(remaining):
+            direct_count += 1
+            if idx - last_saved >= CHECKPOINT_EVERY_ROWS:
+                save_progress(2, idx)
+                last_saved = idx
+            writer.writerow(product_row)
+            check_written(product_row, idx + 2)
+            if row_counts.get("unmatched_rows"):
+                error_rows.append({'rownum': idx + 2, 'product_row': product_rownum, 'ID': product_row[0],
+                                   'referenceCode': product_row[9], 'physicalObjectLocation': product_row[15],
+                                   'title': product_row[6]})
+            for name, value in row_counts.items():
+                counts[name] = counts.get(name, 0) + value
+
+        if report:
+            report.finish(stage, rows=direct_count)
+            for name, value in counts.items():
+                report.count(name, value)
+
+    write_error_report(error_rows, blank_rows, error_path, header,
+                       error_csv_path=os.path.splitext(error_path)[0] + '.csv')
+    if report:
+        report.count("error_rows", len(error_rows))
+        report.count("blank_field_rows", len(blank_rows))
+
+MATCH_CLASSES = ["Compound Audio", "Compound Image", "Compound Audio + Image", "Audio", "Image", "Unmatched",
+                 "Skipped (ID of a compound row)"]
+
+def preview_matches(source1_path, source2_mapping, workers=1):
+    """
+    Classify every source1 row the way source1_to_product would match it, without writing
+    anything: Compound Audio/Image (with the number of child files), direct Audio or Image
+    (with the file), or Unmatched. Returns (one dict per source1 row, counts per class).
+    """
+    preview = []
+    compound_ids = set()
+    with source1_transforms(source2_mapping, "", "", workers) as (transform_compound, transform_direct):
+        # Pass 1: compound parents, as in source1_to_product
+        for source1_id, rows in transform_compound(enumerate(iter_source1_rows(source1_path))):
+            # Numbered as in error.txt: spreadsheet rows, with the header as row 1
+            entry = {"row": len(preview) + 2, "ID": source1_id, "location": "", "match": "", "files": ""}
+            kinds = [r[7] for r in rows if r[3] == 'Compound']
+            if kinds:
+                compound_ids.add(source1_id)
+                entry["match"] = "Compound " + " + ".join("Audio" if kind == 'Sound' else "Image" for kind in kinds)
+                child_count = len(rows) - len(kinds)
+                entry["files"] = f"{child_count} file" if child_count == 1 else f"{child_count} files"
+            preview.append(entry)
+
+        # Pass 2: direct matching for the rest
+        def remaining():
+            for idx, row in enumerate(iter_source1_rows(source1_path)):
+                entry = preview[idx]
+                entry["location"] = (row.get('physicalObjectLocation') or row.get('shelf_locator') or row.get('shelfLocator') or '').strip()
+                if entry["match"]:
+                    continue
+                if entry["ID"] in compound_ids:
+                    entry["match"] = "Skipped (ID of a compound row)"
+                    continue
+                yield idx, row
+
+        for idx, product_row, _ in transform_direct(remaining()):
+            entry = preview[idx]
+            digital_file = product_row[4]
+            if not digital_file:
+                entry["match"] = "Unmatched"
             else:
-                origin_information = ""
-
-            extent = reformat_extent_and_medium(row.get('extentAndMedium', ''))
-            physical_location = row.get('repository', '')
-            slug = row.get('slug', '').strip()
-            location_url = f"https://db-archives.library.queensu.ca/{slug}" if slug else ""
-
-            # Try to find direct image/audio matches using broadened matching
-            direct_image, direct_audio = find_best_direct_matches(phys_obj_loc, shelf_locator, source2_mapping)
-
-            if direct_audio:
-                norm_shelf_locator = normalize_audio_shelf(shelf_locator)
-                side_label = extract_side_label(direct_audio.get('SourceFile') or direct_audio.get('FileName',''), norm_shelf_locator)
-                item_title = f"{title} - {shelf_locator}-{side_label}" if side_label else f"{title} - {shelf_locator}" if shelf_locator else title
-                image_row = [
-                    source1_id, member_of_existing_entity_id, '', 'Audio',
-                    f"repo-ingest://archives/{direct_audio.get('FileName', direct_audio.get('SourceFile',''))}", direct_audio.get('MIMEType',''),
-                    item_title, 'Sound', language, local_identifier, field_val, description, origin_information, extent,
-                    physical_location, shelf_locator, location_url
-                ]
-                writer.writerow(image_row)
-                continue
-
-            if direct_image:
-                sf_base = direct_image.get('SourceFile', '')
-                sf_base_title = os.path.splitext(os.path.basename(sf_base))[0] if sf_base else ""
-                item_title = f"{title} - {sf_base_title}" if sf_base_title else title
-                image_row = [
-                    source1_id, member_of_existing_entity_id, '', 'Image',
-                    f"repo-ingest://archives/{direct_image.get('FileName', direct_image.get('SourceFile',''))}", direct_image.get('MIMEType',''),
-                    item_title, 'Image', language, local_identifier, field_val, description, origin_information, extent,
-                    physical_location, phys_obj_loc, location_url
-                ]
-                writer.writerow(image_row)
-                continue
-
-            # No direct match: write a normal row without digital_file
-            image_row = [
-                source1_id, member_of_existing_entity_id, '', 'Image',
-                '', '', title, 'Image', language, local_identifier, field_val, description, origin_information, extent,
-                physical_location, phys_obj_loc, location_url
-            ]
-            writer.writerow(image_row)
-
-    # Write error/blank report if necessary (error_rows and blank_rows collected earlier if desired)
-    write_error_report(error_rows, blank_rows, error_path, header)
+                entry["match"] = product_row[3]
+                entry["files"] = digital_file[len("repo-ingest://archives/"):]
+
+    counts = dict.fromkeys(MATCH_CLASSES, 0)
+    for entry in preview:
+        counts[entry["match"]] += 1
+    return preview, counts
+
+def print_match_preview(preview, counts):
+    print(f"{'Row':>6}  {'ID':<12} {'Location':<30} {'Match':<24} Files")
+    for entry in preview:
+        print(f"{entry['row']:>6}  {entry['ID'][:12]:<12} {entry['location'][:30]:<30} {entry['match']:<24} {entry['files']}")
+    print()
+    print(f"Dry run over {len(preview)} source1 rows (no files written):")
+    for match_class, count in counts.items():
+        if count or match_class in MATCH_CLASSES[:6]:
+            print(f"  {match_class:<32}{count:>8}")
 
 def pad_photo_number(num, width=3):
     try:
@@ -529,57 +2515,245 @@ def parse_photo_numbers(photo_numbers):
                 result.append(part)
     return [x for x in result if x]
 
-def clean_fieldnames_and_rows(source1_path, cleaned_path):
+_HEADER_SUFFIX_RE = re.compile(r"\s.*")
+_BLANK_VALUE_RE = re.compile(r"^\s+$")
+_COMMA_SPACE_RE = re.compile(r",\s+")
+
+def clean_header(header):
+    # Deduplicate FLIGHT_LINE column names: keep first as 'FLIGHT_LINE', others renamed
+    seen = {}
+    cleaned = []
+    for h in header:
+        # Remove any extra characters before "Record_ID" (including spaces, punctuation, etc.)
+        if "Record_ID" in h:
+            cleaned.append("Record_ID")
+            continue
+        base = _HEADER_SUFFIX_RE.sub("", h.strip())
+        if base not in seen:
+            seen[base] = 1
+            cleaned.append(base)
+        else:
+            # If duplicate, rename (e.g. FLIGHT_LINE_DUPLICATE)
+            cleaned.append(f"{base}_DUPLICATE{seen[base]}")
+            seen[base] += 1
+    return cleaned
+
+def clean_source1_rows(source1_path, cleaned_path=None):
+    """
+    Read the DBText CSV once, yielding each row as a dict under the cleaned header with
+    cleaned values, exactly as csv.DictReader would give them from a cleaned copy.
+    The copy itself (source1_cleaned.csv) is only written when cleaned_path is given.
+    """
     with open(source1_path, newline='', encoding='utf-8') as infile, \
-         open(cleaned_path, 'w', newline='', encoding='utf-8') as outfile:
+         (open(cleaned_path, 'w', newline='', encoding='utf-8') if cleaned_path else contextlib.nullcontext()) as outfile:
         reader = csv.reader(infile)
-        writer = csv.writer(outfile)
-        rows = list(reader)
-        header = rows[0]
-
-        # Deduplicate FLIGHT_LINE column names: keep first as 'FLIGHT_LINE', others renamed
-        seen = {}
-        clean_header = []
-        for h in header:
-            # Remove any extra characters before "Record_ID" (including spaces, punctuation, etc.)
-            if "Record_ID" in h:
-                clean_header.append("Record_ID")
-                continue
-            base = re.sub(r"\s.*", "", h.strip())
-            if base not in seen:
-                seen[base] = 1
-                clean_header.append(base)
-            else:
-                # If duplicate, rename (e.g. FLIGHT_LINE_DUPLICATE)
-                clean_header.append(f"{base}_DUPLICATE{seen[base]}")
-                seen[base] += 1
-        writer.writerow(clean_header)
+        writer = csv.writer(outfile) if outfile else None
+        header = next(reader, None)
+        if header is None:
+            raise ValueError(f"{os.path.basename(source1_path)} is empty.")
+        fieldnames = clean_header(header)
+        if writer:
+            writer.writerow(fieldnames)
+        width = len(fieldnames)
 
-        for row in rows[1:]:
+        for row in reader:
             clean_row = []
             for v in row:
                 v = v.lstrip()
-                v = re.sub(r"^\s+$", " ", v)
-                v = re.sub(r",\s+", ", ", v)
+                v = _BLANK_VALUE_RE.sub(" ", v)
+                v = _COMMA_SPACE_RE.sub(", ", v)
                 clean_row.append(v)
-            writer.writerow(clean_row)
+            if writer:
+                writer.writerow(clean_row)
+            # Blank lines are skipped; short rows read as None, extra values go under None
+            if not clean_row:
+                continue
+            record = dict(zip(fieldnames, clean_row))
+            if width < len(clean_row):
+                record[None] = clean_row[width:]
+            elif width > len(clean_row):
+                for key in fieldnames[len(clean_row):]:
+                    record[key] = None
+            yield record
 
-def maps_mode_generate_product(source1_path, source2_path, output_path, mapping_report_path, member_of_existing_entity_id="10678"):
-    cleaned_source1 = os.path.splitext(source1_path)[0] + "_cleaned.csv"
-    clean_fieldnames_and_rows(source1_path, cleaned_source1)
+def clean_fieldnames_and_rows(source1_path, cleaned_path):
+    # Write the cleaned copy of source1 without building a product
+    for _ in clean_source1_rows(source1_path, cleaned_path):
+        pass
 
-    with open(cleaned_source1, newline='', encoding='utf-8') as f1:
-        reader = csv.DictReader(f1)
-        source1_rows = [dict(row) for row in reader]
+MAPS_WRITE_CHUNK = 10000
+MAPS_PHYSICAL_LOCATION = "Queen's University Maps and Air Photos Collection"
 
-    with open(source2_path, newline='', encoding='utf-8') as f2:
-        reader = csv.DictReader(f2)
-        # Map both SourceFile and FileName for robust lookup
-        source2_rows = {}
-        for row in reader:
-            source2_rows[row.get('SourceFile', '')] = row
-            if 'FileName' in row:
-                source2_rows[row['FileName']] = row
+def photo_number_segments(photo_numbers):
+    """
+    PHOTO_NUMBERS as (photo numbers, padded numbers) list pairs, one pair per comma
+    separated part, so a range such as 1-450 is expanded in one go. Flattened, the
+    numbers are those of parse_photo_numbers.
+    """
+    segments = []
+    if not photo_numbers or not photo_numbers.strip():
+        return segments
+    for part in photo_numbers.split(","):
+        part = part.strip()
+        if "-" in part:
+            range_parts = [x.strip() for x in part.split("-")]
+            if len(range_parts) == 2 and range_parts[0].isdigit() and range_parts[1].isdigit():
+                start = int(range_parts[0])
+                end = int(range_parts[1])
+                if start <= end:
+                    numbers = list(map(str, range(start, end + 1)))
+                    segments.append((numbers, [n.zfill(3) for n in numbers]))
+                else:
+                    numbers = [range_parts[0], range_parts[1]]
+                    segments.append((numbers, [pad_photo_number(n) for n in numbers]))
+                continue
+        if part:
+            segments.append(([part], [pad_photo_number(part)]))
+    return segments
+
+def map_title_and_shelf_locator(location, flight_line, roll, photo_num):
+    # Title and shelf_locator mapping
+    if location and flight_line and photo_num:
+        if roll:
+            title = f'{location} (Flight Line {flight_line}, Roll [{roll}], Photo Number {photo_num})'
+            shelf_locator = f"Flight Line {flight_line}, Roll [{roll}], Photo Number {photo_num}"
+        else:
+            title = f'{location} (Flight Line {flight_line}, Photo Number {photo_num})'
+            shelf_locator = f"Flight Line {flight_line}, Photo Number {photo_num}"
+    elif location:
+        title = location
+        shelf_locator = flight_line or ""
+    else:
+        if flight_line and photo_num:
+            title = f"Flight Line {flight_line}, Photo Number {photo_num}"
+            shelf_locator = f"Flight Line {flight_line}, Photo Number {photo_num}"
+        elif flight_line:
+            title = f"Flight Line {flight_line}"
+            shelf_locator = f"Flight Line {flight_line}"
+        elif photo_num:
+            title = f"Photo Number {photo_num}"
+            shelf_locator = f"Photo Number {photo_num}"
+        else:
+            title = ""
+            shelf_locator = ""
+    return title, shelf_locator
+
+def expand_map_row(row, source2_mimes, member_id, first_id, mapping_problems):
+    """
+    Product rows for one cleaned DBText row, one per photo number, numbered from first_id.
+    source2_mimes maps source2 SourceFile/FileName keys to their MIME type.
+    Everything that does not depend on the photo number is worked out once, and titles,
+    shelf locators and filenames are built for a whole range at a time.
+    """
+    record_id = row.get("Record_ID", "")
+    nts_map_no = row.get("NTS_MAP_NO", "")
+    location = row.get("LOCATION", "")
+    province = row.get("PROVINCE", "")
+    year = row.get("YEAR", "")
+    scale = row.get("SCALE", "")
+    notes = row.get("NOTES", "")
+    shown = row.get("SHOWN", "")
+    flight_line = row.get("FLIGHT_LINE", "")
+    roll = row.get("ROLL", "")
+    date = row.get("DATE", "")
+    orientation = row.get("ORIENTATION", "")
+    image_link = row.get("IMAGE_LINK") or row.get("IMAGE") or ""
+
+    hierarchical_geographic_subject = f"North America|Canada||{province}" if province else ""
+    notes_field = f"scale|{scale}" if scale else ""
+    description_pieces = []
+    if date:
+        description_pieces.append(date.strip())
+    if orientation:
+        description_pieces.append(orientation.strip())
+    if notes:
+        description_pieces.append(notes.strip())
+    description = ". ".join(description_pieces)
+    if description:
+        description += "."
+    elif shown:
+        description = shown
+    else:
+        description = location
+    fl_for_file = flight_line.replace(" ", "")
+    image_link_mime = source2_mimes.get(image_link)
+
+    numbers = []
+    padded = []
+    for segment_numbers, segment_padded in photo_number_segments(row.get("PHOTO_NUMBERS", "")):
+        numbers.extend(segment_numbers)
+        padded.extend(segment_padded)
+    if numbers:
+        # Every photo number is non-empty here, so one title pattern fits the whole row
+        if location and flight_line:
+            roll_part = f", Roll [{roll}]" if roll else ""
+            shelf_prefix = f"Flight Line {flight_line}{roll_part}, Photo Number "
+            shelf_locators = [shelf_prefix + n for n in numbers]
+            title_prefix = f"{location} ("
+            titles = [f"{title_prefix}{shelf})" for shelf in shelf_locators]
+        elif location:
+            titles = [location] * len(numbers)
+            shelf_locators = [flight_line or ""] * len(numbers)
+        else:
+            shelf_prefix = f"Flight Line {flight_line}, Photo Number " if flight_line else "Photo Number "
+            shelf_locators = titles = [shelf_prefix + n for n in numbers]
+        if fl_for_file:
+            filenames = [f"{fl_for_file}_{p}.tif" for p in padded]
+        else:
+            filenames = [image_link] * len(numbers)
+    else:
+        title, shelf_locator = map_title_and_shelf_locator(location, flight_line, roll, "")
+        titles = [title]
+        shelf_locators = [shelf_locator]
+        filenames = [image_link]
+
+    product_rows = []
+    for offset, (title, shelf_locator, digital_filename) in enumerate(zip(titles, shelf_locators, filenames)):
+        digital_file = f"repo-ingest://maps/{digital_filename}" if digital_filename else ""
+        mime = source2_mimes.get(digital_filename) or image_link_mime
+        if not mime:
+            mime = ""
+            mapping_problems.append(
+                f"Could not find MIMEType for {digital_filename or image_link}"
+            )
+        product_rows.append([
+            first_id + offset,     # ID
+            record_id,             # local_item_identifier
+            nts_map_no,
+            title,
+            MAPS_PHYSICAL_LOCATION,
+            hierarchical_geographic_subject,
+            "",                    # persons
+            year,
+            notes_field,
+            description,
+            shelf_locator,
+            "Image",               # resource_type
+            member_id,
+            "Image",               # model
+            digital_file,
+            mime
+        ])
+    return product_rows
+
+def maps_mode_generate_product(source1_path, source2_path, output_path, mapping_report_path, member_of_existing_entity_id="10678",
+                               report=None, keep_cleaned=False, source2_index=False):
+    """
+    source1 is cleaned row by row as the product is written; keep_cleaned also saves the
+    cleaned copy as source1_cleaned.csv next to it. source2_index (True for the default
+    location, or a path) looks files up in a persisted index (see load_source2_index)
+    instead of loading source2.csv.
+    """
+    if report:
+        stage = report.start("load_source2")
+    cleaned_source1 = os.path.splitext(source1_path)[0] + "_cleaned.csv" if keep_cleaned else None
+
+    # Map both SourceFile and FileName for robust lookup
+    if source2_index:
+        source2_rows = load_source2_index(source2_path, None if source2_index is True else source2_index, dot_variants=False)
+    else:
+        source2_rows = load_source2(source2_path, dot_variants=False)
+    source2_mimes = source2_rows.column_by_key("MIMEType")
 
     header = [
         "ID","local_item_identifier","local_identifier","title","physical_location",
@@ -587,130 +2761,30 @@ def maps_mode_generate_product(source1_path, source2_path, output_path, mapping_
         "shelf_locator","resource_type","member_of_existing_entity_id","model","digital_file","mime"
     ]
 
+    if report:
+        report.finish(stage, rows=len(source2_rows.records))
+        stage = report.start("generate_product")
+
     mapping_problems = []
-    product_rows = []
     idx = 1
-    for row in source1_rows:
-        record_id = row.get("Record_ID", "")
-        nts_map_no = row.get("NTS_MAP_NO", "")
-        location = row.get("LOCATION", "")
-        province = row.get("PROVINCE", "")
-        persons = ""
-        year = row.get("YEAR", "")
-        scale = row.get("SCALE", "")
-        notes = row.get("NOTES", "")
-        shown = row.get("SHOWN", "")
-        flight_line = row.get("FLIGHT_LINE", "")
-        roll = row.get("ROLL", "")
-        date = row.get("DATE", "")
-        orientation = row.get("ORIENTATION", "")
-        local_notes = row.get("LOCAL", "")
-        photo_numbers_field = row.get("PHOTO_NUMBERS", "")
-        image_link = row.get("IMAGE_LINK") or row.get("IMAGE") or ""
-
-        photo_numbers = parse_photo_numbers(photo_numbers_field)
-        if not photo_numbers:
-            photo_numbers = [""]
-
-        for photo_num in photo_numbers:
-            # Title and shelf_locator mapping
-            if location and flight_line and photo_num:
-                if roll:
-                    title = f'{location} (Flight Line {flight_line}, Roll [{roll}], Photo Number {photo_num})'
-                    shelf_locator = f"Flight Line {flight_line}, Roll [{roll}], Photo Number {photo_num}"
-                else:
-                    title = f'{location} (Flight Line {flight_line}, Photo Number {photo_num})'
-                    shelf_locator = f"Flight Line {flight_line}, Photo Number {photo_num}"
-            elif location:
-                title = location
-                shelf_locator = flight_line or ""
-            else:
-                if flight_line and photo_num:
-                    title = f"Flight Line {flight_line}, Photo Number {photo_num}"
-                    shelf_locator = f"Flight Line {flight_line}, Photo Number {photo_num}"
-                elif flight_line:
-                    title = f"Flight Line {flight_line}"
-                    shelf_locator = f"Flight Line {flight_line}"
-                elif photo_num:
-                    title = f"Photo Number {photo_num}"
-                    shelf_locator = f"Photo Number {photo_num}"
-                else:
-                    title = ""
-                    shelf_locator = ""
-
-            physical_location = "Queen's University Maps and Air Photos Collection"
-            hierarchical_geographic_subject = f"North America|Canada||{province}" if province else ""
-            notes_field = f"scale|{scale}" if scale else ""
-            description_pieces = []
-            if date:
-                description_pieces.append(date.strip())
-            if orientation:
-                description_pieces.append(orientation.strip())
-            if notes:
-                description_pieces.append(notes.strip())
-            description = ". ".join(description_pieces)
-            if description:
-                description += "."
-            elif shown:
-                description = shown
-            else:
-                description = location
-
-            resource_type = "Image"
-            model = "Image"
-
-            fl_for_file = flight_line.replace(" ", "")
-            pn_padded = pad_photo_number(photo_num)
-            filename_core = ""
-            if fl_for_file and pn_padded:
-                filename_core = f"{fl_for_file}_{pn_padded}.tif"
-            elif image_link:
-                filename_core = image_link
-            else:
-                filename_core = ""
-
-            digital_filename = filename_core
-
-            digital_file = f"repo-ingest://maps/{digital_filename}" if digital_filename else ""
-
-            mime = ""
-            if digital_filename and digital_filename in source2_rows and source2_rows[digital_filename].get("MIMEType"):
-                mime = source2_rows[digital_filename]["MIMEType"]
-            elif image_link and image_link in source2_rows and source2_rows[image_link].get("MIMEType"):
-                mime = source2_rows[image_link]["MIMEType"]
-            else:
-                mapping_problems.append(
-                    f"Could not find MIMEType for {digital_filename or image_link}"
-                )
-
-            member_id = member_of_existing_entity_id or ""
-
-            product_row = [
-                idx,                   # ID
-                record_id,             # local_item_identifier
-                nts_map_no,
-                title,
-                physical_location,
-                hierarchical_geographic_subject,
-                persons,
-                year,
-                notes_field,
-                description,
-                shelf_locator,
-                resource_type,
-                member_id,
-                model,
-                digital_file,
-                mime
-            ]
-            product_rows.append(product_row)
-            idx += 1
-
-    with open(output_path, "w", newline='', encoding="utf-8") as fout:
+    member_id = member_of_existing_entity_id or ""
+    # Rows are expanded a catalogue row at a time and written in chunks instead of being buffered
+    with open(output_path, "w", newline='', encoding="utf-8", buffering=1 << 20) as fout:
         writer = csv.writer(fout)
         writer.writerow(header)
-        for row in product_rows:
-            writer.writerow(row)
+        pending = []
+        for row in clean_source1_rows(source1_path, cleaned_source1):
+            product_rows = expand_map_row(row, source2_mimes, member_id, idx, mapping_problems)
+            idx += len(product_rows)
+            pending.extend(product_rows)
+            if len(pending) >= MAPS_WRITE_CHUNK:
+                writer.writerows(pending)
+                pending = []
+        writer.writerows(pending)
+
+    if report:
+        report.finish(stage, rows=idx - 1)
+        report.count("missing_mime", len(mapping_problems))
 
     if mapping_problems:
         with open(mapping_report_path, "w", encoding="utf-8") as repf:
@@ -753,7 +2827,491 @@ def write_missing_metadata_report(product_path, source2_path, report_path):
         else:
             rpt.write("All SourceFile entries in source2.csv were matched in product.csv.\n")
 
-if __name__ == "__main__":
+def _product_row_groups(reader, header):
+    # Consecutive rows that have to stay together: a row plus the rows after it whose
+    # member_of points at an ID already in the group (compound children follow their parent)
+    id_col = header.index("ID") if "ID" in header else None
+    member_col = header.index("member_of") if "member_of" in header else None
+    group = []
+    group_ids = set()
+    for row in reader:
+        member_of = row[member_col] if member_col is not None and member_col < len(row) else ""
+        if group and not (member_of and member_of in group_ids):
+            yield group
+            group = []
+            group_ids = set()
+        group.append(row)
+        if id_col is not None and id_col < len(row):
+            group_ids.add(row[id_col])
+    if group:
+        yield group
+
+def write_product_batches(product_path, max_rows=None, max_bytes=None):
+    """
+    Split a product CSV into batch files of at most max_rows rows and/or max_bytes bytes
+    (header included) for separate Islandora Workbench tasks. Compound parents and their
+    member_of children always land in the same batch, so a group bigger than the limit
+    gets a batch of its own. Batches and manifest.json go to <product>_batches next to the
+    product CSV, which is left as it is. Returns the manifest path.
+    """
+    stem = os.path.splitext(os.path.basename(product_path))[0]
+    batch_dir = os.path.join(os.path.dirname(product_path), f"{stem}_batches")
+    os.makedirs(batch_dir, exist_ok=True)
+    # Batches left by an earlier run would not be in the new manifest
+    old_batch = re.compile(rf"{re.escape(stem)}_\d{{3,}}\.csv")
+    for name in os.listdir(batch_dir):
+        if old_batch.fullmatch(name):
+            os.remove(os.path.join(batch_dir, name))
+    sizer = io.StringIO()
+    sizer_writer = csv.writer(sizer)
+
+    def encoded_size(rows):
+        sizer.seek(0)
+        sizer.truncate()
+        sizer_writer.writerows(rows)
+        return len(sizer.getvalue().encode("utf-8"))
+
+    def write_batch(rows, size):
+        name = f"{stem}_{len(batches) + 1:03d}.csv"
+        with open(os.path.join(batch_dir, name), "w", newline='', encoding="utf-8") as bf:
+            writer = csv.writer(bf)
+            writer.writerow(header)
+            writer.writerows(rows)
+        batches.append({"file": name, "rows": len(rows), "bytes": size,
+                        "first_id": rows[0][0], "last_id": rows[-1][0]})
+
+    batches = []
+    with open(product_path, newline='', encoding="utf-8") as pf:
+        reader = csv.reader(pf)
+        header = next(reader, [])
+        header_size = encoded_size([header])
+        rows = []
+        size = header_size
+        for group in _product_row_groups(reader, header):
+            group_size = encoded_size(group)
+            if rows and ((max_rows and len(rows) + len(group) > max_rows) or
+                         (max_bytes and size + group_size > max_bytes)):
+                write_batch(rows, size)
+                rows = []
+                size = header_size
+            rows.extend(group)
+            size += group_size
+        if rows:
+            write_batch(rows, size)
+
+    manifest_path = os.path.join(batch_dir, "manifest.json")
+    with open(manifest_path, "w", encoding="utf-8") as mf:
+        json.dump({"product": os.path.basename(product_path), "max_rows": max_rows, "max_bytes": max_bytes,
+                   "total_rows": sum(b["rows"] for b in batches), "batches": batches}, mf, indent=2)
+    print(f"{len(batches)} ingest batches written to {batch_dir}")
+    return manifest_path
+
+FFMPEG_PATH = "ffmpeg"
+# Same encoding as convert_wav_to_mp3.bat; -nostdin and -y keep pool workers from waiting on prompts
+FFMPEG_MP3_ARGS = ["-vn", "-c:a", "libmp3lame", "-ar", "44100"]
+# Folder in the MP3 folder that copies are encoded into before being moved into place.
+# The leading "." keeps unfinished copies out of the metadata scan, since
+# list_source_files and exiftool -r skip such names.
+TRANSCODE_STAGING_NAME = ".a2i_transcoding"
+
+def list_wav_masters(wav_folder):
+    # The *.wav files directly in wav_folder (not subfolders), as the .bat converted them
+    with os.scandir(wav_folder) as entries:
+        return sorted(entry.name for entry in entries
+                      if entry.is_file() and not entry.name.startswith(".") and entry.name.lower().endswith(".wav"))
+
+def transcode_wav_to_mp3(wav_folder, mp3_folder, jobs=None):
+    """
+    Make an MP3 access copy in mp3_folder of every WAV master in wav_folder, running up
+    to `jobs` ffmpeg processes at once (default: one per CPU). An MP3 that is at least as
+    new as its WAV is taken as up to date and skipped. Each copy is written to a .part
+    file in a hidden staging folder (TRANSCODE_STAGING_NAME) and moved into place when
+    ffmpeg finishes, so an interrupted run never leaves a truncated MP3 that looks current
+    or a .part file that the next scan would list. Returns {"converted": [...], "skipped": [...], "failed": [...]}.
+    """
+    os.makedirs(mp3_folder, exist_ok=True)
+    results = {"converted": [], "skipped": [], "failed": []}
+    pending = []
+    for name in list_wav_masters(wav_folder):
+        wav_path = os.path.join(wav_folder, name)
+        mp3_path = os.path.join(mp3_folder, os.path.splitext(name)[0] + ".mp3")
+        try:
+            mp3_stat = os.stat(mp3_path)
+        except FileNotFoundError:
+            mp3_stat = None
+        if mp3_stat and mp3_stat.st_size and mp3_stat.st_mtime_ns >= os.stat(wav_path).st_mtime_ns:
+            results["skipped"].append(name)
+        else:
+            pending.append((name, wav_path, mp3_path))
+
+    staging_folder = os.path.join(mp3_folder, TRANSCODE_STAGING_NAME)
+
+    def convert(item):
+        name, wav_path, mp3_path = item
+        part_path = os.path.join(staging_folder, os.path.basename(mp3_path) + ".part")
+        args = [FFMPEG_PATH, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+                "-i", wav_path] + FFMPEG_MP3_ARGS + ["-f", "mp3", part_path]
+        proc = subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if proc.returncode != 0:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(part_path)
+            return name, proc.stderr.decode("utf-8", "replace").strip() or f"ffmpeg exited with {proc.returncode}"
+        os.replace(part_path, mp3_path)
+        return name, None
+
+    print(f"{len(results['skipped'])} MP3s up to date, converting {len(pending)} WAV files")
+    if pending:
+        os.makedirs(staging_folder, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+            for name, error in pool.map(convert, pending):
+                if error:
+                    print(f"Could not convert {name}: {error}")
+                    results["failed"].append(name)
+                else:
+                    print(f"Converted {name}")
+                    results["converted"].append(name)
+        # Left behind (with the .part files) only if a run is killed mid-encode
+        with contextlib.suppress(OSError):
+            os.rmdir(staging_folder)
+    return results
+
+def run_archives(dest_folder, source_folder, member_of_existing_entity_id=None, is_corporate=None,
+                 uniform_authorized_name=None, workers=1, use_cache=False, backend="exiftool", zip_path=None,
+                 profile=False, extract=False, batch_rows=None, batch_bytes=None, match_workers=1, dry_run=False,
+                 wav_folder=None, transcode_jobs=None, resume=False, source2_index=False, pipeline=False,
+                 prefilter=False, ask=True):
+    """
+    Archives flow: scan source_folder into source2.csv, read the AtoM clipboard zip in
+    dest_folder (or zip_path) and write product.csv and error.txt there. The export's CSV is
+    read straight from the zip unless extract is set, which unpacks the zip and leaves the
+    CSV as source1.csv. Answers left as None are taken from the checkpoint or prompted for;
+    with ask=False nothing is prompted for, a member_of_existing_entity_id that is neither
+    given nor saved raises ValueError and the name answers default to False/"". Stage
+    timings go to run_report.json; profile=True also saves a cProfile dump of the product
+    generation. batch_rows/batch_bytes also split product.csv into
+    ingest batches (see write_product_batches). match_workers > 1 matches source1 rows in
+    that many processes. source2_index (True for source2_index.sqlite in dest_folder, or a
+    path) matches against a persisted index (see load_source2_index) that later runs on
+    the same scan reuse. With wav_folder, MP3 access copies of its WAV masters are made in
+    source_folder first (see transcode_wav_to_mp3), so the scan picks them up. pipeline=True
+    scans in a background thread while the export is unpacked and the questions are asked,
+    building the source2 lookups as exiftool reports each file (see stream_exiftool_source2)
+    and the matcher indexes right after. prefilter=True only scans the files that some
+    locator in the export could match (see LocatorPrefilter). Returns the product.csv path.
+
+    dry_run only scans and prints how each source1 row would be matched (see
+    preview_matches); no product, error or report files are written and None is returned.
+
+    Progress is saved in checkpoint.json in dest_folder (see RunCheckpoint), which is
+    removed when the run succeeds. resume=True continues an earlier run with the same
+    inputs: a finished scan is not repeated if source2.csv is unchanged, saved answers
+    are not asked again, and product.csv is continued from its last checkpoint.
+    """
+    report = RunReport("archives")
+    media_changed = False
+    zip_file = zip_path or find_clipboard_zip(dest_folder)
+    source2_path = os.path.join(dest_folder, "source2.csv")
+    checkpoint = RunCheckpoint(os.path.join(dest_folder, CHECKPOINT_NAME), {
+        "source_folder": os.path.abspath(source_folder), "zip_path": os.path.abspath(zip_file),
+        "zip_signature": file_signature(zip_file), "backend": backend, "extract": extract, "prefilter": prefilter,
+    })
+    if resume and not dry_run:
+        if checkpoint.load():
+            print(f"Resuming from {checkpoint.path}")
+        else:
+            print("No checkpoint to resume from; starting from the beginning")
+    if not ask and not dry_run:
+        saved = checkpoint.get("answers", {})
+        if member_of_existing_entity_id is None:
+            member_of_existing_entity_id = saved.get("member_of_existing_entity_id")
+            if member_of_existing_entity_id is None:
+                raise ValueError("No member_of_existing_entity_id was given or saved in the checkpoint")
+        if is_corporate is None:
+            is_corporate = saved.get("is_corporate", False)
+        if uniform_authorized_name is None:
+            uniform_authorized_name = saved.get("uniform_authorized_name", "")
+    if wav_folder:
+        with report.stage("transcode") as stage:
+            transcoded = transcode_wav_to_mp3(wav_folder, source_folder, transcode_jobs)
+            stage["rows"] = len(transcoded["converted"])
+        media_changed = bool(transcoded["converted"])
+        for name, names in transcoded.items():
+            report.count(f"wav_{name}", len(names))
+    def open_source2():
+        if source2_index:
+            return load_source2_index(source2_path, None if source2_index is True else source2_index)
+        return load_source2(source2_path)
+
+    def build_file_filter():
+        if not prefilter:
+            return None
+        with report.stage("prefilter"):
+            return LocatorPrefilter(iter_source1_rows(zip_file)).wanted
+
+    def scan_and_open_source2(file_filter):
+        # Pipelined scan, run in the background thread
+        if backend == "exiftool" and (workers or 1) <= 1 and not use_cache and not source2_index:
+            source2_mapping = stream_exiftool_source2(dest_folder, source_folder, file_filter=file_filter,
+                                                      cancel=scan_cancel)
+            scan_finished()
+        else:
+            run_exiftool_and_create_source2_csv(dest_folder, source_folder, workers=workers, use_cache=use_cache,
+                                                backend=backend, file_filter=file_filter, cancel=scan_cancel)
+            scan_finished()
+            source2_mapping = open_source2()
+        # Worker processes build their own indexes, and Source2Index keeps them in its file
+        if match_workers <= 1 and not source2_index:
+            source2_mapping.build_indexes()
+        return source2_mapping
+
+    def scan_finished():
+        # A new scan can change every match, so earlier product progress no longer applies
+        if not dry_run:
+            checkpoint.save(source2=file_signature(source2_path), product=None)
+
+    scan = None
+    scan_cancel = ScanCancel()
+    scanned = checkpoint.get("source2")
+    if scanned and not media_changed and os.path.exists(source2_path) and file_signature(source2_path) == scanned:
+        print("Metadata scan already complete; reusing source2.csv")
+    elif pipeline:
+        scan_filter = build_file_filter()
+        print(f"Scanning {source_folder} in the background")
+        scan_stage = report.start("metadata_scan")
+        scan = Future()
+
+        def run_scan():
+            scan.set_running_or_notify_cancel()
+            try:
+                scan.set_result(scan_and_open_source2(scan_filter))
+            except BaseException as e:
+                scan.set_exception(e)
+
+        # A daemon thread, and its exiftool processes are killed if this thread fails or is
+        # interrupted (see below), so Ctrl-C at a prompt does not wait for the scan to end
+        threading.Thread(target=run_scan, name="metadata-scan", daemon=True).start()
+    else:
+        scan_filter = build_file_filter()
+        with report.stage("metadata_scan"):
+            run_exiftool_and_create_source2_csv(dest_folder, source_folder, workers=workers, use_cache=use_cache,
+                                                backend=backend, file_filter=scan_filter)
+        scan_finished()
+
+    def wait_for_scan():
+        source2_mapping = scan.result()
+        report.finish(scan_stage, rows=len(source2_mapping.records))
+        return source2_mapping
+
+    try:
+        if dry_run:
+            source2_mapping = wait_for_scan() if scan else open_source2()
+            print_match_preview(*preview_matches(zip_file, source2_mapping, workers=match_workers))
+            return None
+        source1_path = checkpoint.get("source1_path")
+        if extract and not (source1_path and os.path.exists(source1_path)):
+            with report.stage("zip_extraction"):
+                source1_path = extract_and_rename_zip(dest_folder, zip_file)
+            checkpoint.save(source1_path=source1_path)
+        elif not extract:
+            source1_path = zip_file
+            print(f"Reading the AtoM export straight from {os.path.basename(source1_path)}")
+        output_path = os.path.join(dest_folder, "product.csv")
+        error_path = os.path.join(dest_folder, "error.txt")
+        answers = checkpoint.get("answers", {})
+        if member_of_existing_entity_id is None:
+            member_of_existing_entity_id = answers.get("member_of_existing_entity_id")
+        if member_of_existing_entity_id is None:
+            member_of_existing_entity_id = input("Enter value for member_of_existing_entity_id: ").strip()
+        if is_corporate is None:
+            is_corporate = answers.get("is_corporate")
+        if uniform_authorized_name is None:
+            uniform_authorized_name = answers.get("uniform_authorized_name")
+        is_corporate, uniform_authorized_name = ask_name_answers(is_corporate, uniform_authorized_name)
+        checkpoint.save(answers=dict(answers, member_of_existing_entity_id=member_of_existing_entity_id,
+                                     is_corporate=is_corporate, uniform_authorized_name=uniform_authorized_name))
+        if scan:
+            source2_mapping = wait_for_scan()
+        else:
+            with report.stage("load_source2") as stage:
+                source2_mapping = open_source2()
+                stage["rows"] = len(source2_mapping.records)
+    except BaseException:
+        if scan and not scan.done():
+            scan_cancel.cancel()
+        raise
+    with profiled(os.path.join(dest_folder, "product_profile.prof"), profile):
+        source1_to_product(source1_path, source2_mapping, output_path, member_of_existing_entity_id, error_path,
+                           is_corporate=is_corporate, uniform_authorized_name=uniform_authorized_name, report=report,
+                           workers=match_workers, checkpoint=checkpoint)
+    print("product.csv generated successfully.")
+    print("error.txt and error.csv written for unmatched rows and blank fields.")
+    if batch_rows or batch_bytes:
+        with report.stage("ingest_batches"):
+            write_product_batches(output_path, batch_rows, batch_bytes)
+    report.write(os.path.join(dest_folder, "run_report.json"))
+    checkpoint.remove()
+    return output_path
+
+def run_maps(map_folder, member_of_existing_entity_id="10678", output_file_name="product.csv", image_folder=None,
+             cleanup=None, workers=1, backend="exiftool", profile=False, keep_cleaned=False,
+             batch_rows=None, batch_bytes=None, source2_index=False):
+    """
+    Maps flow over map_folder (source1.csv and source2.csv). If source2.csv is missing it is
+    created from image_folder. cleanup=None asks whether to delete the working files;
+    keep_cleaned also writes source1_cleaned.csv.
+    Stage timings go to run_report.json (profile=True adds a cProfile dump), and
+    batch_rows/batch_bytes split the product into ingest batches. source2_index is passed
+    to maps_mode_generate_product. Returns the product CSV path.
+    """
+    report = RunReport("maps")
+    source1_path = os.path.join(map_folder, "source1.csv")
+    source2_path = os.path.join(map_folder, "source2.csv")
+    if not output_file_name:
+        output_file_name = "product.csv"
+    elif not output_file_name.lower().endswith(".csv"):
+        output_file_name = f"{output_file_name}.csv"
+    output_path = os.path.join(map_folder, output_file_name)
+    mapping_report_path = os.path.join(map_folder, "mapping_report.txt")
+    if not os.path.exists(source1_path):
+        raise FileNotFoundError("source1.csv not found in selected folder.")
+    if not os.path.exists(source2_path):
+        if not image_folder:
+            raise FileNotFoundError("source2.csv not found in selected folder.")
+        with report.stage("metadata_scan"):
+            run_exiftool_and_create_source2_csv(map_folder, image_folder, workers=workers, backend=backend)
+    with profiled(os.path.join(map_folder, "product_profile.prof"), profile):
+        maps_mode_generate_product(
+            source1_path,
+            source2_path,
+            output_path,
+            mapping_report_path,
+            member_of_existing_entity_id=member_of_existing_entity_id,
+            report=report,
+            keep_cleaned=keep_cleaned,
+            source2_index=source2_index
+        )
+    print(f"{os.path.basename(output_path)} generated successfully.")
+
+    # Write missing_metadata.txt report after product.csv is generated
+    missing_metadata_report_path = os.path.join(map_folder, "missing_metadata.txt")
+    with report.stage("missing_metadata_report"):
+        write_missing_metadata_report(output_path, source2_path, missing_metadata_report_path)
+    if batch_rows or batch_bytes:
+        with report.stage("ingest_batches"):
+            write_product_batches(output_path, batch_rows, batch_bytes)
+    report.write(os.path.join(map_folder, "run_report.json"))
+    print(f"Missing metadata report written to {os.path.basename(missing_metadata_report_path)}.")
+
+    # Cleanup prompt logic
+    if cleanup is None:
+        working_files = "source2.csv, and source1_cleaned.csv" if keep_cleaned else "source2.csv"
+        cleanup = input(f"Would you like to delete {working_files} from the folder? (y/n): ").strip().lower() == "y"
+    if cleanup:
+        files_to_delete = [
+            os.path.join(map_folder, "source2.csv"),
+            os.path.join(map_folder, "source1_cleaned.csv"),
+        ]
+        for fp in files_to_delete:
+            try:
+                if os.path.exists(fp):
+                    os.remove(fp)
+                    print(f"Deleted {fp}")
+            except Exception as e:
+                print(f"Could not delete {fp}: {e}")
+    else:
+        print("Cleanup skipped.")
+    return output_path
+
+BATCH_MANIFEST_COLUMNS = ["zip_path", "media_folder", "parent_id", "output_dir", "corporate", "authorized_name"]
+
+def read_batch_manifest(manifest_path, output_root):
+    """
+    Read a batch manifest CSV with one archives job per row: zip_path, media_folder and
+    parent_id are required; output_dir (default <output_root>/<zip name>), corporate (y/n)
+    and authorized_name are optional. Relative paths are taken from the manifest's folder.
+    Jobs run at the same time, so two rows resolving to the same output_dir are an error.
+    """
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    jobs = []
+    output_rows = {}
+    with open(manifest_path, newline='', encoding='utf-8') as mf:
+        for rownum, row in enumerate(csv.DictReader(mf), start=2):
+            row = {k.strip(): (v or "").strip() for k, v in row.items() if k}
+            missing = [col for col in BATCH_MANIFEST_COLUMNS[:3] if not row.get(col)]
+            if missing:
+                raise ValueError(f"Manifest row {rownum} is missing {', '.join(missing)}")
+            zip_path = os.path.join(base, row["zip_path"])
+            name = os.path.splitext(os.path.basename(zip_path))[0]
+            output_dir = os.path.join(base, row["output_dir"]) if row.get("output_dir") else os.path.join(output_root, name)
+            output_key = os.path.normcase(os.path.abspath(output_dir))
+            if output_key in output_rows:
+                raise ValueError(f"Manifest rows {output_rows[output_key]} and {rownum} both write to {output_dir}; "
+                                 "give one of them an output_dir")
+            output_rows[output_key] = rownum
+            jobs.append({
+                "name": name,
+                "zip_path": zip_path,
+                "media_folder": os.path.join(base, row["media_folder"]),
+                "parent_id": row["parent_id"],
+                "output_dir": output_dir,
+                "is_corporate": row.get("corporate", "").lower() in ("y", "yes", "true", "1"),
+                "authorized_name": row.get("authorized_name", ""),
+            })
+    return jobs
+
+def _run_batch_job(job, workers, use_cache, backend, exiftool_path, extract=False, prefilter=False):
+    # Runs in a pool process: one archives conversion, with its console output in log.txt
+    global EXIFTOOL_PATH
+    EXIFTOOL_PATH = exiftool_path
+    os.makedirs(job["output_dir"], exist_ok=True)
+    started = time.time()
+    result = {"job": job["name"], "zip_path": job["zip_path"], "output_dir": job["output_dir"],
+              "status": "ok", "product_rows": "", "seconds": "", "error": ""}
+    with open(os.path.join(job["output_dir"], "log.txt"), "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        try:
+            if not os.path.isfile(job["zip_path"]):
+                raise FileNotFoundError(f"Clipboard zip not found: {job['zip_path']}")
+            output_path = run_archives(job["output_dir"], job["media_folder"], job["parent_id"],
+                                       is_corporate=job["is_corporate"], uniform_authorized_name=job["authorized_name"],
+                                       workers=workers, use_cache=use_cache, backend=backend, zip_path=job["zip_path"],
+                                       extract=extract, prefilter=prefilter)
+            with open(output_path, newline='', encoding='utf-8') as pf:
+                result["product_rows"] = sum(1 for _ in csv.reader(pf)) - 1
+        except Exception as e:
+            traceback.print_exc(file=log)
+            result["status"] = "failed"
+            result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = f"{time.time() - started:.1f}"
+    return result
+
+def run_batch(manifest_path, output_root, jobs=None, workers=1, use_cache=False, backend="exiftool", extract=False,
+              prefilter=False):
+    """
+    Run every archives job in the manifest across a process pool of `jobs` processes
+    (default: one per CPU). Each job writes to its own folder; batch_summary.csv in
+    output_root lists the outcome of every job. Returns the summary rows.
+    """
+    batch_jobs = read_batch_manifest(manifest_path, output_root)
+    os.makedirs(output_root, exist_ok=True)
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        futures = [pool.submit(_run_batch_job, job, workers, use_cache, backend, EXIFTOOL_PATH, extract, prefilter)
+                   for job in batch_jobs]
+        for future in futures:
+            result = future.result()
+            print(f"{result['job']}: {result['status']} ({result['seconds']}s) {result['error']}".rstrip())
+            results.append(result)
+
+    summary_path = os.path.join(output_root, "batch_summary.csv")
+    with open(summary_path, "w", newline='', encoding='utf-8') as sf:
+        writer = csv.DictWriter(sf, fieldnames=["job", "zip_path", "output_dir", "status", "product_rows", "seconds", "error"])
+        writer.writeheader()
+        writer.writerows(results)
+    failed = sum(1 for r in results if r["status"] != "ok")
+    print(f"{len(results) - failed} of {len(results)} jobs succeeded. Summary written to {summary_path}")
+    return results
+
+def interactive_main():
     print("Are you creating this for Archives (a) or Map (m)?")
     mode = input("Type 'a' for Archives or 'm' for Map: ").strip().lower()
     if mode == 'a':
@@ -767,17 +3325,11 @@ if __name__ == "__main__":
         if not source_folder:
             print("No source folder selected. Exiting.")
             exit(1)
-
-        run_exiftool_and_create_source2_csv(dest_folder, source_folder)
-        source1_path = extract_and_rename_zip(dest_folder)
-        source2_path = os.path.join(dest_folder, "source2.csv")
-        output_path = os.path.join(dest_folder, "product.csv")
-        error_path = os.path.join(dest_folder, "error.txt")
-        member_of_existing_entity_id = input("Enter value for member_of_existing_entity_id: ").strip()
-        source2_mapping = load_source2(source2_path)
-        source1_to_product(source1_path, source2_mapping, output_path, member_of_existing_entity_id, error_path)
-        print("product.csv generated successfully.")
-        print("error.txt written for unmatched rows and blank fields.")
+        resume = False
+        if os.path.exists(os.path.join(dest_folder, CHECKPOINT_NAME)):
+            print("An unfinished run was found in this folder. Resume it? (y/n)")
+            resume = input().strip().lower() == "y"
+        run_archives(dest_folder, source_folder, extract=True, resume=resume)
 
     elif mode == 'm':
         print("Please select the folder containing source1.csv and (optionally) source2.csv.")
@@ -785,20 +3337,12 @@ if __name__ == "__main__":
         if not map_folder:
             print("No folder selected. Exiting.")
             exit(1)
-        source1_path = os.path.join(map_folder, "source1.csv")
-        source2_path = os.path.join(map_folder, "source2.csv")
         output_file_name = input("Enter desired output file name for product CSV (e.g. product, product_v2, etc.): ").strip()
-        if not output_file_name:
-            output_file_name = "product.csv"
-        else:
-            if not output_file_name.lower().endswith(".csv"):
-                output_file_name = f"{output_file_name}.csv"
-        output_path = os.path.join(map_folder, output_file_name)
-        mapping_report_path = os.path.join(map_folder, "mapping_report.txt")
-        if not os.path.exists(source1_path):
+        if not os.path.exists(os.path.join(map_folder, "source1.csv")):
             print("source1.csv not found in selected folder.")
             exit(1)
-        if not os.path.exists(source2_path):
+        image_folder = None
+        if not os.path.exists(os.path.join(map_folder, "source2.csv")):
             print("source2.csv not found in selected folder.")
             print("Do you want to create source2.csv using exiftool? (y/n)")
             answer = input().strip().lower()
@@ -808,41 +3352,122 @@ if __name__ == "__main__":
                 if not image_folder:
                     print("No source folder selected. Exiting.")
                     exit(1)
-                run_exiftool_and_create_source2_csv(map_folder, image_folder)
             else:
                 print("Cannot proceed without source2.csv. Exiting.")
                 exit(1)
         member_of_existing_entity_id = input("Enter value for member_of_existing_entity_id (default 10678): ").strip() or "10678"
-        maps_mode_generate_product(
-            source1_path,
-            source2_path,
-            output_path,
-            mapping_report_path,
-            member_of_existing_entity_id=member_of_existing_entity_id
-        )
-        print(f"{os.path.basename(output_path)} generated successfully.")
-
-        # Write missing_metadata.txt report after product.csv is generated
-        missing_metadata_report_path = os.path.join(map_folder, "missing_metadata.txt")
-        write_missing_metadata_report(output_path, source2_path, missing_metadata_report_path)
-        print(f"Missing metadata report written to {os.path.basename(missing_metadata_report_path)}.")
-
-        # Cleanup prompt logic
-        cleanup = input("Would you like to delete source2.csv, and source1_cleaned.csv from the folder? (y/n): ").strip().lower()
-        if cleanup == "y":
-            files_to_delete = [
-                os.path.join(map_folder, "source2.csv"),
-                os.path.join(map_folder, "source1_cleaned.csv"),
-            ]
-            for fp in files_to_delete:
-                try:
-                    if os.path.exists(fp):
-                        os.remove(fp)
-                        print(f"Deleted {fp}")
-                except Exception as e:
-                    print(f"Could not delete {fp}: {e}")
-        else:
-            print("Cleanup skipped.")
+        run_maps(map_folder, member_of_existing_entity_id, output_file_name, image_folder=image_folder)
 
     else:
         print("Invalid selection. Exiting.")
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Transform AtoM clipboard exports (archives) or DBText catalogues (maps) into Islandora Workbench CSVs. "
+                    "Run without arguments for the interactive prompts."
+    )
+    modes = parser.add_subparsers(dest="mode")
+
+    archives = modes.add_parser("archives", help="AtoM clipboard export + media folder")
+    archives.add_argument("--dest", required=True, help="folder holding the AtoM clipboard zip; outputs are written here")
+    archives.add_argument("--source", required=True, help="folder of media files to scan")
+    archives.add_argument("--parent-id", help="member_of_existing_entity_id for top-level rows (required unless --dry-run or --resume)")
+    archives.add_argument("--dry-run", action="store_true", help="only print how each AtoM row would be matched; no product files are written")
+    archives.add_argument("--corporate", action="store_true", default=None,
+                          help="records are from a Corporation or Conceptual entity (organizations column)")
+    archives.add_argument("--authorized-name", help="Authorized form of name to use for all records")
+    archives.add_argument("--match-workers", type=int, default=1, help="processes for matching source1 rows to files (default 1)")
+    archives.add_argument("--zip", help="clipboard export to use (default: the first zip in --dest by name)")
+    archives.add_argument("--resume", action="store_true", help="continue an interrupted run from checkpoint.json in --dest")
+    archives.add_argument("--wav-source", help="folder of WAV masters to convert to MP3 in --source before scanning")
+    archives.add_argument("--pipeline", action="store_true",
+                          help="scan in the background while the export is read and questions are answered, "
+                               "building the match lookups as exiftool reports each file")
+
+    transcode = modes.add_parser("transcode", help="convert WAV masters to MP3 access copies with ffmpeg, in parallel")
+    transcode.add_argument("--source", required=True, help="folder of .wav files")
+    transcode.add_argument("--dest", required=True, help="folder for the .mp3 files")
+
+    maps = modes.add_parser("maps", help="DBText air photo catalogue")
+    maps.add_argument("--folder", required=True, help="folder containing source1.csv and (optionally) source2.csv")
+    maps.add_argument("--parent-id", default="10678", help="member_of_existing_entity_id (default 10678)")
+    maps.add_argument("--output", default="product.csv", help="product CSV file name (default product.csv)")
+    maps.add_argument("--image-folder", help="folder to scan if source2.csv does not exist yet")
+    maps.add_argument("--cleanup", action="store_true", help="delete source2.csv and source1_cleaned.csv afterwards")
+    maps.add_argument("--keep-cleaned", action="store_true", help="also save the cleaned DBText rows as source1_cleaned.csv")
+
+    batch = modes.add_parser("batch", help="several archives conversions from a manifest CSV, in parallel")
+    batch.add_argument("--manifest", required=True, help="CSV with zip_path, media_folder, parent_id and optional output_dir, corporate, authorized_name columns")
+    batch.add_argument("--output", required=True, help="folder for per-job output folders and batch_summary.csv")
+    batch.add_argument("--jobs", type=int, help="conversions to run at once (default: one per CPU)")
+
+    for sub in (archives, maps, batch):
+        sub.add_argument("--workers", type=int, default=1, help="parallel metadata scanning workers (default 1)")
+        sub.add_argument("--backend", choices=METADATA_BACKENDS, default="exiftool", help="metadata backend (default exiftool)")
+        sub.add_argument("--exiftool", default=EXIFTOOL_PATH, help=f"path to the exiftool executable (default {EXIFTOOL_PATH})")
+    for sub in (archives, maps):
+        sub.add_argument("--batch-rows", type=int, help="also split the product into ingest batches of at most this many rows")
+        sub.add_argument("--batch-bytes", type=int, help="also split the product into ingest batches of at most this many bytes")
+        sub.add_argument("--profile", action="store_true", help="also save a cProfile dump of product generation (product_profile.prof)")
+        sub.add_argument("--index", nargs="?", const=True, default=False, metavar="PATH",
+                         help="match against a saved source2 index, reused while source2.csv is unchanged "
+                              f"(default {SOURCE2_INDEX_NAME} next to source2.csv)")
+    for sub in (archives, transcode):
+        sub.add_argument("--transcode-jobs", type=int, help="ffmpeg processes to run at once (default: one per CPU)")
+        sub.add_argument("--ffmpeg", default=FFMPEG_PATH, help=f"path to the ffmpeg executable (default {FFMPEG_PATH})")
+    for sub in (archives, batch):
+        sub.add_argument("--extract", action="store_true", help="unpack the clipboard zip and keep its CSV as source1.csv (default: read it from the zip)")
+        sub.add_argument("--cache", action="store_true", help="reuse metadata for unchanged files from source2_cache.sqlite")
+        sub.add_argument("--prefilter", action="store_true",
+                         help="only scan files whose names an AtoM locator in the export could match")
+    return parser
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv:
+        interactive_main()
+        return 0
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if not args.mode:
+        parser.print_help()
+        return 1
+    if args.mode == "archives" and not args.parent_id and not (args.dry_run or args.resume):
+        parser.error("the following arguments are required: --parent-id")
+    global EXIFTOOL_PATH, FFMPEG_PATH
+    if args.mode != "transcode":
+        EXIFTOOL_PATH = args.exiftool
+    if args.mode in ("archives", "transcode"):
+        FFMPEG_PATH = args.ffmpeg
+    try:
+        if args.mode == "transcode":
+            results = transcode_wav_to_mp3(args.source, args.dest, args.transcode_jobs)
+            return 1 if results["failed"] else 0
+        elif args.mode == "archives":
+            # --corporate and --authorized-name stay None when left out, so --resume keeps the saved answers
+            run_archives(args.dest, args.source, args.parent_id, is_corporate=args.corporate,
+                         uniform_authorized_name=args.authorized_name, workers=args.workers,
+                         use_cache=args.cache, backend=args.backend, zip_path=args.zip,
+                         profile=args.profile, extract=args.extract,
+                         batch_rows=args.batch_rows, batch_bytes=args.batch_bytes, match_workers=args.match_workers,
+                         dry_run=args.dry_run, wav_folder=args.wav_source, transcode_jobs=args.transcode_jobs,
+                         resume=args.resume, source2_index=args.index, pipeline=args.pipeline,
+                         prefilter=args.prefilter, ask=False)
+        elif args.mode == "batch":
+            results = run_batch(args.manifest, args.output, jobs=args.jobs, workers=args.workers,
+                                use_cache=args.cache, backend=args.backend, extract=args.extract,
+                                prefilter=args.prefilter)
+            return 1 if any(r["status"] != "ok" for r in results) else 0
+        else:
+            run_maps(args.folder, args.parent_id, args.output, image_folder=args.image_folder,
+                     cleanup=args.cleanup, workers=args.workers, backend=args.backend, profile=args.profile,
+                     keep_cleaned=args.keep_cleaned, batch_rows=args.batch_rows, batch_bytes=args.batch_bytes,
+                     source2_index=args.index)
+    except (FileNotFoundError, ValueError) as e:
+        print(e)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
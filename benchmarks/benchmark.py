@@ -0,0 +1,292 @@
+"""
+Benchmark harness for atom2islandora.
+
+Generates synthetic AtoM clipboard exports (source1.csv), exiftool inventories
+(source2.csv) and DBText air photo catalogues at the requested scales, then times
+each stage in a fresh process and reports rows/sec and peak RSS as JSON so results
+can be compared across versions.
+
+    py benchmarks/benchmark.py --scales 1000,10000 --output bench.json
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import atom2islandora as a2i
+
+STAGES = [
+    "load_source2",
+    "build_indexes",
+    "is_compound",
+    "find_best_direct_matches",
+    "source1_to_product",
+    "maps_mode_generate_product",
+]
+
+ATOM_COLUMNS = [
+    "legacyId", "referenceCode", "title", "physicalObjectLocation", "eventActors",
+    "radTitleStatementOfResponsibility", "scopeAndContent", "eventStartDates", "eventEndDates",
+    "extentAndMedium", "repository", "slug",
+]
+SOURCE2_COLUMNS = ["SourceFile", "FileName", "FileCreateDate", "PageCount", "FileTypeExtension", "MIMEType", "LayerCount"]
+DBTEXT_COLUMNS = [
+    "Record_ID", "NTS_MAP_NO", "LOCATION", "PROVINCE", "YEAR", "SCALE", "NOTES", "SHOWN",
+    "FLIGHT_LINE", "ROLL", "DATE", "ORIENTATION", "LOCAL", "PHOTO_NUMBERS", "IMAGE_LINK",
+]
+SIDE_LABELS = ["SideA", "SideB", "Side1", "Side2", "Tape1", "Tape2"]
+PEOPLE = ["PhilBrown", "MaryOliver", "CFRC", "JohnSmith", "Principal"]
+
+def _shelf_locator(rnd, i):
+    kind = rnd.random()
+    if kind < 0.45:
+        return f"SR {1000 + i // 7}.{i % 700 + 1}"
+    if kind < 0.7:
+        return f"MI {10 + i // 50}.{i % 50 + 1}"
+    if kind < 0.9:
+        return f"F{i:05d}-{rnd.randint(1, 40):04d}"
+    if kind < 0.95:
+        return f"SR {1000 + i // 7}.{i % 700 + 1} (box {rnd.randint(1, 9)})"
+    return ""
+
+def _media_files(rnd, loc):
+    # Files a digitization project would produce for one description
+    base = loc.split(" (")[0].replace(" ", "")
+    if not base:
+        return []
+    files = []
+    if base.startswith("SR"):
+        stem = base.replace(".", rnd.choice(["_", "_", "."]))
+        person = rnd.choice(PEOPLE)
+        for side in rnd.sample(SIDE_LABELS[:4], rnd.randint(1, 2)):
+            files.append((f"{stem}-{person}-Reminiscences-{side}.mp3", "audio/mpeg", "mp3"))
+        if rnd.random() < 0.3:
+            files.append((f"{stem}.wav", "audio/x-wav", "wav"))
+    elif base.startswith("MI"):
+        stem = base.replace(".", rnd.choice(["_", "."]))
+        for page in range(1, rnd.randint(2, 6)):
+            files.append((f"{stem}_{page:03d}.tif", "image/tiff", "tif"))
+    else:
+        files.append((f"{base}.jpg", "image/jpeg", "jpg"))
+        if rnd.random() < 0.2:
+            files.append((f"{base}_transcript.pdf", "application/pdf", "pdf"))
+    return files
+
+def generate_archives(folder, rows, seed=1):
+    """Write source1.csv and source2.csv for `rows` AtoM descriptions; returns the source2 row count."""
+    rnd = random.Random(seed)
+    files = []
+    with open(os.path.join(folder, "source1.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(ATOM_COLUMNS)
+        for i in range(rows):
+            loc = _shelf_locator(rnd, i)
+            start = rnd.randint(1940, 2000)
+            writer.writerow([
+                str(10000 + i), f"CA ON00239 F{i // 100:05d}-{i}", f"Description {i}", loc,
+                rnd.choice(["", "Brown, Phil", "CFRC (Radio station : Kingston, Ont.)", "NULL"]),
+                rnd.choice(["", "Queen's University"]),
+                "Interview recorded for the CFRC anniversary series. " * rnd.randint(1, 20),
+                str(start), rnd.choice(["", str(start), str(start + 3)]),
+                "* 1 audio reel\n* 2 photographs", "Queen's University Archives", f"description-{i}",
+            ])
+            if rnd.random() < 0.85:
+                files.extend(_media_files(rnd, loc))
+    # Unrelated material on the same drive
+    for i in range(len(files) // 10):
+        files.append((f"misc_{i}.txt", "text/plain", "txt"))
+    rnd.shuffle(files)
+    with open(os.path.join(folder, "source2.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(SOURCE2_COLUMNS)
+        for name, mime, ext in files:
+            subdir = rnd.choice(["", "audio/", "images/batch1/"])
+            writer.writerow([subdir + name, name, "2023:05:01 10:20:30-04:00", "", ext, mime, ""])
+    return len(files)
+
+def generate_maps(folder, rows, seed=1):
+    """Write a DBText source1.csv and its source2.csv for `rows` catalogue records; returns the source2 row count."""
+    rnd = random.Random(seed)
+    files = set()
+    with open(os.path.join(folder, "source1.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(DBTEXT_COLUMNS)
+        for i in range(rows):
+            flight_line = f"A {10000 + i // 3}"
+            first = rnd.randint(1, 200)
+            last = first + rnd.randint(0, 30)
+            photo_numbers = rnd.choice([f"{first}-{last}", f"{first}, {first + 2}, {first + 4}-{last + 4}", str(first)])
+            writer.writerow([
+                str(i), f"31C/{i % 16}", "Kingston", "Ontario", "1960", "1:15840", "", "",
+                flight_line, rnd.choice(["", "R1"]), "June 1960", "N", "", photo_numbers, "",
+            ])
+            for n in a2i.parse_photo_numbers(photo_numbers):
+                if rnd.random() < 0.9:
+                    files.add(f"{flight_line.replace(' ', '')}_{a2i.pad_photo_number(n)}.tif")
+    with open(os.path.join(folder, "source2.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(SOURCE2_COLUMNS)
+        for name in sorted(files):
+            writer.writerow([name, name, "2023:05:01 10:20:30-04:00", "", "tif", "image/tiff", ""])
+    return len(files)
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+@contextlib.contextmanager
+def _quiet():
+    # Silence the progress prints of the functions being timed
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def _source1_rows(folder):
+    with open(os.path.join(folder, "source1.csv"), newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def run_stage(stage, archives_dir, maps_dir):
+    """Run one stage in the current process; returns (rows processed, seconds)."""
+    source2_path = os.path.join(archives_dir, "source2.csv")
+    with open(source2_path, newline="", encoding="utf-8") as f:
+        source2_rows = sum(1 for _ in csv.reader(f)) - 1
+    if stage == "load_source2":
+        start = time.perf_counter()
+        a2i.load_source2(source2_path)
+        return source2_rows, time.perf_counter() - start
+    if stage == "maps_mode_generate_product":
+        with open(os.path.join(maps_dir, "source1.csv"), newline="", encoding="utf-8") as f:
+            rows = sum(1 for _ in csv.reader(f)) - 1
+        with _quiet():
+            start = time.perf_counter()
+            a2i.maps_mode_generate_product(
+                os.path.join(maps_dir, "source1.csv"), os.path.join(maps_dir, "source2.csv"),
+                os.path.join(maps_dir, "product.csv"), os.path.join(maps_dir, "mapping_report.txt"),
+            )
+            return rows, time.perf_counter() - start
+
+    source2_mapping = a2i.load_source2(source2_path)
+    if stage == "build_indexes":
+        start = time.perf_counter()
+        a2i.CompoundIndex(source2_mapping)
+        a2i.DirectMatcher(source2_mapping)
+        return source2_rows, time.perf_counter() - start
+    source1_rows = _source1_rows(archives_dir)
+    if stage == "is_compound":
+        compound_index = a2i.CompoundIndex(source2_mapping)
+        start = time.perf_counter()
+        for row in source1_rows:
+            a2i.is_compound(row, source2_mapping, compound_index)
+        return len(source1_rows), time.perf_counter() - start
+    if stage == "find_best_direct_matches":
+        matcher = a2i.DirectMatcher(source2_mapping)
+        start = time.perf_counter()
+        for row in source1_rows:
+            loc = (row.get("physicalObjectLocation") or "").strip()
+            a2i.find_best_direct_matches(loc, loc, source2_mapping, matcher)
+        return len(source1_rows), time.perf_counter() - start
+    if stage == "source1_to_product":
+        with _quiet():
+            start = time.perf_counter()
+            a2i.source1_to_product(
+                os.path.join(archives_dir, "source1.csv"), source2_mapping,
+                os.path.join(archives_dir, "product.csv"), "1234", os.path.join(archives_dir, "error.txt"),
+                is_corporate=False, uniform_authorized_name="",
+            )
+            return len(source1_rows), time.perf_counter() - start
+    raise ValueError(f"Unknown stage: {stage}")
+
+def _stage_worker(stage, archives_dir, maps_dir):
+    rows, seconds = run_stage(stage, archives_dir, maps_dir)
+    return {
+        "stage": stage,
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(rows / seconds, 1) if seconds else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(a2i.__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(scales, stages, workdir, seed=1):
+    results = {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "scales": [],
+    }
+    for scale in scales:
+        archives_dir = os.path.join(workdir, f"archives_{scale}")
+        maps_dir = os.path.join(workdir, f"maps_{scale}")
+        os.makedirs(archives_dir, exist_ok=True)
+        os.makedirs(maps_dir, exist_ok=True)
+        source2_rows = generate_archives(archives_dir, scale, seed)
+        maps_source2_rows = generate_maps(maps_dir, scale, seed)
+        entry = {"source1_rows": scale, "source2_rows": source2_rows, "maps_source2_rows": maps_source2_rows, "stages": []}
+        for stage in stages:
+            # A fresh process per stage so peak RSS belongs to that stage alone
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                stage_result = pool.submit(_stage_worker, stage, archives_dir, maps_dir).result()
+            entry["stages"].append(stage_result)
+            print(f"{scale:>8} rows  {stage:<28} {stage_result['seconds']:>9.3f}s  "
+                  f"{stage_result['rows_per_sec'] or 0:>12.1f} rows/s  {stage_result['peak_rss_mb']} MB", file=sys.stderr)
+        results["scales"].append(entry)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time atom2islandora stages on synthetic data.")
+    parser.add_argument("--scales", default="1000,10000", help="comma-separated source1 row counts (default 1000,10000)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma-separated stages (default: all of {', '.join(STAGES)})")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--workdir", help="keep generated data here instead of a temporary folder")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    scales = [int(x) for x in args.scales.split(",") if x.strip()]
+    stages = [x.strip() for x in args.stages.split(",") if x.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        results = run_benchmarks(scales, stages, args.workdir, args.seed)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            results = run_benchmarks(scales, stages, workdir, args.seed)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
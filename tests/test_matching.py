@@ -0,0 +1,176 @@
+import csv
+import os
+import random
+import re
+
+import atom2islandora as a2i
+
+HEADER = ["SourceFile", "FileName", "MIMEType", "n"]
+
+
+def make_store(rows):
+    return a2i.Source2Store(HEADER, [list(r) for r in rows])
+
+
+def make_index(tmp_path, rows):
+    source2 = tmp_path / "source2.csv"
+    with open(source2, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+    return a2i.load_source2_index(str(source2), str(tmp_path / "index.sqlite"))
+
+
+def matched(row):
+    return row and row["n"]
+
+
+def test_sr_mi_dot_match_stops_at_the_dotted_number(tmp_path):
+    rows = [
+        ["SR1104_31-Interview.mp3", "SR1104_31-Interview.mp3", "audio/mpeg", "1"],
+        ["SR1104_3-Interview.mp3", "SR1104_3-Interview.mp3", "audio/mpeg", "2"],
+        ["SR1104_35.mp3", "SR1104_35.mp3", "audio/mpeg", "3"],
+        ["SR1104_3.tif", "SR1104_3.tif", "image/tiff", "4"],
+    ]
+    for mapping in (make_store(rows), make_index(tmp_path, rows), dict(make_store(rows).items())):
+        assert matched(a2i.sr_mi_dot_match("SR 1104.3 (box 2)", mapping)) == "2"
+        assert matched(a2i.sr_mi_dot_match("SR 1104.31", mapping)) == "1"
+        assert a2i.sr_mi_dot_match("SR 1104.36", mapping) is None
+
+
+def test_sr_mi_dot_match_needs_a_boundary(tmp_path):
+    rows = [["SR1104_31-Interview.mp3", "SR1104_31-Interview.mp3", "audio/mpeg", "1"]]
+    for mapping in (make_store(rows), make_index(tmp_path, rows)):
+        assert a2i.sr_mi_dot_match("SR 1104.3 (box 2)", mapping) is None
+
+
+def test_prefilter_skips_longer_dotted_numbers():
+    prefilter = a2i.LocatorPrefilter([{"physicalObjectLocation": "SR 1104.3 (box 2)"}])
+    assert prefilter.wanted("audio/SR1104_3-Interview.mp3")
+    assert not prefilter.wanted("audio/SR1104_31.mp3")
+
+
+# The original linear scans over every source2 row, kept as oracles for the indexes
+
+def reference_variants(s):
+    s = re.sub(r"\s+", "", s.lower())
+    variants = [s, s.replace(".", "_"), s.replace("_", "."), re.sub(r"[._\-]", "", s),
+                re.sub(r"(?<=\d)_(?=\d)", ".", s)]
+    return [v for i, v in enumerate(variants) if v and v not in variants[:i]]
+
+
+def reference_direct_matches(phys_obj_loc, shelf_locator, rows):
+    variants = reference_variants(phys_obj_loc) + reference_variants(shelf_locator)
+
+    def compact(s):
+        return re.sub(r"[._\-]", "", s)
+
+    passes = [
+        lambda c, v: compact(c) == compact(v),
+        lambda c, v: (c.startswith(v) or v.startswith(c)
+                      or compact(c).startswith(compact(v)) or compact(v).startswith(compact(c))),
+        lambda c, v: v in c or c in v or compact(v) in compact(c) or compact(c) in compact(v),
+    ]
+    best = []
+    for kind in ("image/", "audio/"):
+        found = None
+        for test in passes:
+            for row in rows:
+                cands = {os.path.splitext(os.path.basename(row[f]))[0].lower() for f in ("SourceFile", "FileName")}
+                if (row["MIMEType"] or "").lower().startswith(kind) and any(
+                        test(c, v) for c in cands if c for v in variants):
+                    found = row
+                    break
+            if found:
+                break
+        best.append(found)
+    return tuple(best)
+
+
+def reference_compound(row, mapping):
+    loc = (row.get("physicalObjectLocation") or "").strip()
+    shelf = (row.get("physicalObjectLocation") or row.get("shelf_locator") or "").strip()
+    prefixes = [p.lower() + sep for p in (loc.replace(".", "_").replace(" ", ""), a2i.normalize_audio_shelf(shelf))
+                for sep in "-_"]
+    children = ([], [])
+    for key, s2row in mapping.items():
+        cand = os.path.splitext(os.path.basename(key))[0].lower()
+        if cand.startswith(tuple(prefixes)) and not any(s2row is c for kids in children for c in kids):
+            mt = s2row["MIMEType"].lower()
+            if mt.startswith("image/"):
+                children[0].append(s2row)
+            elif mt.startswith("audio/"):
+                children[1].append(s2row)
+    return children
+
+
+def random_rows(rnd, alphabet="ab1 2._-"):
+    def rs(k):
+        return "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, k)))
+    return [[rnd.choice(["", "d/"]) + rs(6) + rnd.choice([".tif", ".mp3", "", ".x"]), rs(5) + ".tif",
+             rnd.choice(["image/tiff", "audio/mpeg", "text/plain", "", "IMAGE/X"]), str(i)]
+            for i in range(rnd.randint(1, 25))], rs
+
+
+def test_direct_and_compound_matches_equal_linear_scan():
+    rnd = random.Random(5)
+    for _ in range(150):
+        rows, rs = random_rows(rnd)
+        store = make_store(rows)
+        matcher = a2i.DirectMatcher(store)
+        compound_index = a2i.CompoundIndex(store)
+        # The key -> row dict load_source2 used to return
+        plain = dict(store.items())
+        unique_rows = list({id(r): r for r in store.values()}.values())
+        for _ in range(15):
+            loc, shelf = rs(7), rs(7)
+            expected = reference_direct_matches(loc, shelf, unique_rows)
+            for mapping, index in ((store, matcher), (store, None), (plain, None)):
+                got = a2i.find_best_direct_matches(loc, shelf, mapping, index)
+                assert [matched(r) for r in got] == [matched(r) for r in expected], (loc, shelf)
+            source1_row = {"physicalObjectLocation": loc, "shelf_locator": shelf}
+            expected = reference_compound(source1_row, store)
+            for mapping, index in ((store, compound_index), (store, None), (plain, None)):
+                got = a2i.is_compound(source1_row, mapping, index)
+                assert [[r["n"] for r in kids] for kids in got] == [[r["n"] for r in kids] for kids in expected], loc
+
+
+def write_product(tmp_path, source1, source2_rows):
+    source2 = tmp_path / "source2.csv"
+    with open(source2, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(source2_rows)
+    product, errors = tmp_path / "product.csv", tmp_path / "error.txt"
+    a2i.source1_to_product(str(source1), a2i.load_source2(str(source2)), str(product), "9", str(errors),
+                           is_corporate=False, uniform_authorized_name="")
+    return product.read_text(encoding="utf-8"), errors.read_text(encoding="utf-8")
+
+
+def test_prefilter_keeps_every_file_a_row_can_match(tmp_path):
+    rnd = random.Random(11)
+
+    def rs(k):
+        return "".join(rnd.choice("aB1 2._-é") for _ in range(rnd.randint(0, k)))
+
+    def num():
+        return str(rnd.randint(1, 2))
+
+    dropped = 0
+    for _ in range(150):
+        source2_rows = [["SourceFile", "FileName", "MIMEType"]]
+        for _ in range(rnd.randint(1, 30)):
+            name = rnd.choice([rs(8), "SR" + num() + "_" + num() + rs(3), "mi" + num() + "." + num() + rs(2), "zz" + rs(5)])
+            path = rnd.choice(["", "d/", "SR1_2/", "a.b/"]) + name + rnd.choice([".tif", ".mp3", "", ".x"])
+            source2_rows.append([path, os.path.basename(path),
+                                 rnd.choice(["image/tiff", "audio/mpeg", "text/plain", "", "IMAGE/X"])])
+        source1 = tmp_path / "source1.csv"
+        with open(source1, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["legacyId", "title", "physicalObjectLocation", "referenceCode"])
+            for i in range(rnd.randint(1, 8)):
+                loc = rnd.choice([rs(9), rnd.choice(["SR", "MI", "sr "]) + num() + "." + num() + rs(3), ""])
+                writer.writerow([str(i), "T" + str(i), loc, "R"])
+        prefilter = a2i.LocatorPrefilter(a2i.iter_source1_rows(str(source1)))
+        kept = source2_rows[:1] + [r for r in source2_rows[1:] if prefilter.wanted(r[0])]
+        dropped += len(source2_rows) - len(kept)
+        assert write_product(tmp_path, source1, kept) == write_product(tmp_path, source1, source2_rows)
+    assert dropped
@@ -0,0 +1,74 @@
+import zlib
+
+import pytest
+
+import atom2islandora as a2i
+
+
+def classic_pdf(pages):
+    kids = b" ".join(b"%d 0 R" % (3 + i) for i in range(pages))
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages]
+    objects += [b"<< /Type /Page /Parent 2 0 R >>"] * pages
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % (i + 1) + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f\r\n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n\r\n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def xref_stream_pdf(stream_dict):
+    # Catalog and pages as plain objects, found through an xref stream with the given dictionary
+    out = bytearray(b"%PDF-1.5\n")
+    offsets = [len(out)]
+    out += b"1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n"
+    offsets.append(len(out))
+    out += b"2 0 obj\n<< /Type /Pages /Count 4 >>\nendobj\n"
+    xref = len(out)
+    rows = [bytes(4)] + [bytes([1]) + offset.to_bytes(2, "big") + bytes(1) for offset in offsets + [xref]]
+    data = zlib.compress(b"".join(rows))
+    out += (b"3 0 obj\n" + stream_dict % len(data) + b"\nstream\n" + data
+            + b"\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n" % xref)
+    return bytes(out)
+
+
+def probe(tmp_path, name, data):
+    (tmp_path / name).write_bytes(data)
+    return a2i.probe_file_metadata(str(tmp_path), name)
+
+
+def test_pdf_page_count_after_long_kids_array(tmp_path):
+    assert probe(tmp_path, "long.pdf", classic_pdf(800))["PageCount"] == "800"
+
+
+def test_pdf_page_count_from_xref_stream(tmp_path):
+    good = xref_stream_pdf(b"<< /Type /XRef /Size 4 /W [1 2 1] /Root 1 0 R /Filter /FlateDecode /Length %d >>")
+    assert probe(tmp_path, "xref.pdf", good)["PageCount"] == "4"
+
+
+def test_damaged_pdf_keeps_its_row(tmp_path):
+    no_widths = xref_stream_pdf(b"<< /Type /XRef /Size 4 /Root 1 0 R /Filter /FlateDecode /Length %d >>")
+    no_length = xref_stream_pdf(b"<< /Type /XRef /Size 4 /W [1 2 1] /Root 1 0 R /Filter /FlateDecode /L %d >>")
+    for name, data in (("no_widths.pdf", no_widths), ("no_length.pdf", no_length)):
+        row = probe(tmp_path, name, data)
+        assert row["MIMEType"] == "application/pdf"
+        assert "PageCount" not in row
+    rows = a2i.scan_source_files(str(tmp_path), ["no_widths.pdf", "no_length.pdf"], workers=2, backend="python")
+    assert [row["FileName"] for row in rows] == ["no_widths.pdf", "no_length.pdf"]
+
+
+def test_cancelling_one_scan_leaves_others_running(tmp_path):
+    (tmp_path / "a.pdf").write_bytes(classic_pdf(2))
+    cancelled = a2i.ScanCancel()
+    cancelled.cancel()
+    with pytest.raises(RuntimeError):
+        a2i.scan_source_files(str(tmp_path), ["a.pdf"], backend="python", cancel=cancelled)
+    for cancel in (None, a2i.ScanCancel()):
+        rows = a2i.scan_source_files(str(tmp_path), ["a.pdf"], backend="python", cancel=cancel)
+        assert rows[0]["PageCount"] == "2"